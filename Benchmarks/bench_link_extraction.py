@@ -0,0 +1,106 @@
+"""
+Benchmark of the .xlsx link extraction paths of Scraping_SAMA_Data on a saved Monthly Statistics page.
+
+    python Benchmarks/bench_link_extraction.py [saved_page.html | --synthetic] [--repeat N]
+
+By default the paths run on sama_monthly_statistics_page.html, a trimmed copy of the Monthly Statistics page
+(SharePoint view state, navigation, the bulletin list table and the footer). --synthetic generates a
+SharePoint-like page of about 1 MB instead, with the bulletin links in the middle of the navigation, scripts
+and view-state noise. For each path the best time of N runs and the peak memory (tracemalloc) of one run
+are printed:
+
+- bs4_html_parser: the original full BeautifulSoup tree with html.parser
+- bs4_lxml_strainer: lxml with a SoupStrainer limited to <a> tags (if lxml is installed)
+- fast_first: regex pre-scan + streaming HTMLParser stopping at the first link (used by the scraper)
+- fast_all: the same parser collecting every link (used by the backfill)
+"""
+
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Code'))
+
+from bs4 import BeautifulSoup, SoupStrainer
+
+import Scraping_SAMA_Data as s
+
+PAGE_URL = s.SAMA_URL
+SAVED_PAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sama_monthly_statistics_page.html')
+
+
+def synthetic_page(noise_blocks=4000):
+    """
+    Build a page shaped like the SharePoint MonthlyStatistics.aspx page: a large view state, navigation,
+    inline scripts, the bulletin list in the middle and a long footer.
+    """
+    head = ['<html dir="rtl"><head><title>الإحصاءات الشهرية</title>',
+            '<script type="text/javascript">var _spPageContextInfo = {"webServerRelativeUrl": "/ar-sa"};</script>',
+            '</head><body><form method="post" action="./MonthlyStatistics.aspx">',
+            f'<input type="hidden" name="__VIEWSTATE" value="{"A" * 200_000}" />']
+    noise = [f'<div class="ms-nav"><a href="/ar-sa/Pages/page{i}.aspx">رابط {i}</a><span>نص {i}</span></div>'
+             for i in range(noise_blocks)]
+    bulletins = [f'<li><a href="/ar-sa/EconomicReports/MonthlyStatistics/Monthly_Bulletin_{year}_{month:02d}.xlsx">'
+                 f'النشرة الشهرية {year}-{month:02d}</a></li>'
+                 for year in range(2024, 2014, -1) for month in range(12, 0, -1)]
+    tail = ['</form></body></html>']
+    return '\n'.join(head + noise + ['<ul class="bulletins">'] + bulletins + ['</ul>'] + noise + tail).encode('utf-8')
+
+
+def extraction_paths():
+    paths = {
+        'bs4_html_parser': lambda html: s.find_xlsx_links(html, PAGE_URL, first_only=True, fast=False),
+        'fast_first': lambda html: s.find_xlsx_links(html, PAGE_URL, first_only=True),
+        'fast_all': lambda html: s.find_xlsx_links(html, PAGE_URL),
+    }
+    try:
+        import lxml  # noqa: F401
+        strainer = SoupStrainer('a', href=True)
+        paths['bs4_lxml_strainer'] = lambda html: [
+            a['href'] for a in BeautifulSoup(html, 'lxml', parse_only=strainer).find_all('a', href=True)
+            if a['href'].lower().endswith('.xlsx')][:1]
+    except ImportError:
+        pass
+    return paths
+
+
+def measure(function, html, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        result = function(html)
+        best = min(best, time.perf_counter() - start_time)
+
+    tracemalloc.start()
+    function(html)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('page', nargs='?', default=SAVED_PAGE, help="Saved Monthly Statistics page")
+    parser.add_argument('--synthetic', action='store_true', help="Generate a page of about 1 MB instead")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        html = synthetic_page()
+        source = 'synthetic page'
+    else:
+        with open(args.page, 'rb') as file:
+            html = file.read()
+        source = os.path.basename(args.page)
+
+    print(f"Page: {source} ({len(html) / 1024 / 1024:.2f} MB), best of {args.repeat} runs")
+    print(f"{'path':<20}{'seconds':>10}{'peak MB':>10}  first link")
+    for name, function in extraction_paths().items():
+        seconds, peak, links = measure(function, html, args.repeat)
+        print(f"{name:<20}{seconds:>10.4f}{peak / 1024 / 1024:>10.2f}  {links[0] if links else None}")
+
+
+if __name__ == '__main__':
+    main()
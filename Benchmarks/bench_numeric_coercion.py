@@ -0,0 +1,76 @@
+"""
+Micro-benchmark of the numeric coercion of transform_data on a synthetic sheet.
+
+    python Benchmarks/bench_numeric_coercion.py [--rows N] [--columns M] [--repeat R]
+
+Compares the row-wise `split_and_keep_integer` apply + per-column pd.to_numeric of the original transform
+with the batched `coerce_numeric_columns`, after checking that both give the same frame.
+The synthetic sheet mixes ints, floats, '0.0' strings and whole floats,
+like the cells of sheets 30c/30d/30e.
+"""
+
+import time
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from etl_module import load_etl_module
+
+
+def synthetic_sheet(rows, columns, seed=0):
+    rng = np.random.default_rng(seed)
+    data = {'Period': [f"{2000 + i // 12}-{i % 12 + 1:02d}-28 00:00:00 " for i in range(rows)]}
+    for i in range(columns):
+        if i % 2 == 0:
+            values = rng.integers(0, 10 ** 8, rows).astype(object)
+            name = f'Number_of_Transactions_{i}'
+        else:
+            values = np.round(rng.random(rows) * 10 ** 6, 2).astype(object)
+            name = f'Sales_{i}'
+        values[rng.random(rows) < 0.05] = '0.0'
+        whole = rng.random(rows) < 0.05
+        values[whole] = [float(int(value)) if not isinstance(value, str) else value for value in values[whole]]
+        data[name] = values
+    return pd.DataFrame(data)
+
+
+def row_wise(etl, df):
+    df = df.copy()
+    for col in [col for col in df.columns if 'Number' in col]:
+        df[col] = df[col].apply(etl.split_and_keep_integer).astype('Int64')
+    for col in [col for col in df.columns if 'Sales' in col]:
+        df[col] = pd.to_numeric(df[col], errors='coerce').astype('Float64')
+    return df
+
+
+def best_time(function, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start_time = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start_time)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--columns', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    etl = load_etl_module()
+    df = synthetic_sheet(args.rows, args.columns)
+
+    pd.testing.assert_frame_equal(row_wise(etl, df), etl.coerce_numeric_columns(df))
+
+    row_wise_seconds = best_time(lambda: row_wise(etl, df), args.repeat)
+    batched_seconds = best_time(lambda: etl.coerce_numeric_columns(df), args.repeat)
+    print(f"{args.rows} rows x {args.columns} numeric columns, best of {args.repeat} runs")
+    print(f"row-wise apply : {row_wise_seconds:.4f} s")
+    print(f"batched        : {batched_seconds:.4f} s ({row_wise_seconds / batched_seconds:.1f}x faster)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+"""
+Benchmark of the SAMA ETL pipeline on synthetic Monthly Bulletin workbooks, with a regression check.
+
+    python Benchmarks/bench_pipeline.py [--years N] [--sectors M] [--cities K] [--files F] [--repeat R]
+                                        [--database-url URL] [--schema S] [--load-workers W]
+                                        [--baseline PATH] [--save-baseline] [--tolerance T]
+
+F workbooks are generated with `synthetic_bulletin` and the stages of SAMA_refactor-V2 are timed, median of R runs:
+
+- read: `read_excel_sheets` on every workbook, without the parsed-sheet cache
+- transform: `transform_data` on the read sheets
+- load: `load_transformed_dataframes` into empty destination tables
+- reload: the same load again, every period already exists (the usual monthly run)
+
+The destination is a fresh SQLite file by default, or the database of --database-url (e.g. a local PostgreSQL;
+the tables of the benchmark are replaced there).
+
+--save-baseline stores the results as the baseline JSON. Otherwise they are compared with the baseline and the
+script exits with status 1 when a stage is slower than its baseline by more than --tolerance and by more than
+MIN_REGRESSION_SECONDS, so the noise of short stages is not reported. Runs with fewer than MIN_COMPARE_REPEAT
+repeats are too noisy to be compared and are only printed. Baselines are machine-specific: the machine and
+library versions are stored with them and a mismatch is reported.
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import statistics
+import logging
+import platform
+import argparse
+import tempfile
+
+import pandas as pd
+import sqlalchemy
+
+import synthetic_bulletin as sb
+from etl_module import load_etl_module
+
+BENCHMARK_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_BASELINE = os.path.join(BENCHMARK_DIRECTORY, 'bench_pipeline_baseline.json')
+DEFAULT_TOLERANCE = 0.25
+DEFAULT_REPEAT = 5
+# A stage slower than its baseline by less than this is never reported as a regression
+MIN_REGRESSION_SECONDS = 0.1
+# Fewest repeats whose median is compared with the baseline
+MIN_COMPARE_REPEAT = 3
+# Parameters which must match between the results and the baseline to compare them
+WORKLOAD_PARAMETERS = ('years', 'sectors', 'cities', 'files', 'load_workers', 'dialect')
+
+
+def median_time(function, repeat, setup=None):
+    """
+    Return the median wall time of `repeat` calls of function(setup()) and the result of the last call.
+    The setup is not timed.
+    """
+    seconds, result = [], None
+    for _ in range(repeat):
+        argument = setup() if setup else None
+        start_time = time.perf_counter()
+        result = function(argument) if setup else function()
+        seconds.append(time.perf_counter() - start_time)
+    return statistics.median(seconds), result
+
+
+def generate_workbooks(directory, files, years, sectors, cities):
+    """
+    Write `files` synthetic bulletins, oldest first by modification time like the downloads they stand for.
+    """
+    for position in range(files):
+        path = os.path.join(directory, f'Monthly_Bulletin_{position + 1:02d}.xlsx')
+        sb.make_workbook(path, years, sectors, cities, seed=position + 1)
+        os.utime(path, (time.time() - files + position,) * 2)
+    return os.path.join(directory, 'Monthly_Bulletin_*.xlsx')
+
+
+def create_destination_tables(etl, engine, schema, transformed):
+    """
+    (Re)create the destination tables empty, with the columns of the frames as they are loaded.
+    """
+    for table_name, df in transformed.items():
+        etl.add_load_columns(df.head(0), pd.Timestamp.now()).to_sql(table_name, con=engine, schema=schema,
+                                                                    if_exists='replace', index=False)
+
+
+def run_benchmark(args, work_directory):
+    etl = load_etl_module()
+    # the ETL logs every sheet and table at INFO
+    logging.getLogger().setLevel(logging.WARNING)
+
+    pattern = generate_workbooks(work_directory, args.files, args.years, args.sectors, args.cities)
+    stages = {}
+
+    seconds, sheets = median_time(lambda: etl.read_excel_sheets(pattern, use_cache=False), args.repeat)
+    stages['read'] = {'seconds': seconds, 'rows': sum(len(df) for _, df in sheets)}
+
+    # transform_data changes the frames it is given, every run gets copies
+    seconds, transformed = median_time(etl.transform_data, args.repeat,
+                                     setup=lambda: [(sheet_name, df.copy()) for sheet_name, df in sheets])
+    stages['transform'] = {'seconds': seconds, 'rows': sum(len(df) for df in transformed.values())}
+    if len(transformed) != 3 * len(etl.SHEET_NAMES):
+        raise RuntimeError(f"transform_data returned {len(transformed)} tables, see the log above")
+
+    database_url = args.database_url or f"sqlite:///{os.path.join(work_directory, 'bench.db')}"
+    engine = sqlalchemy.create_engine(database_url)
+    try:
+        def load(_):
+            return etl.load_transformed_dataframes(transformed, engine, args.schema, max_workers=args.load_workers)[1]
+
+        def check(table_results):
+            failed = {table_name: result['error'] for table_name, result in table_results.items() if result['status'] == 'failed'}
+            if failed:
+                raise RuntimeError(f"Tables failed to load: {failed}")
+
+        rows = sum(len(df) for df in transformed.values())
+        seconds, table_results = median_time(load, args.repeat, setup=lambda: create_destination_tables(etl, engine, args.schema, transformed))
+        check(table_results)
+        stages['load'] = {'seconds': seconds, 'rows': rows}
+
+        seconds, table_results = median_time(load, args.repeat, setup=lambda: None)
+        check(table_results)
+        stages['reload'] = {'seconds': seconds, 'rows': rows}
+        dialect = engine.dialect.name
+    finally:
+        engine.dispose()
+
+    return {
+        'parameters': {'years': args.years, 'sectors': args.sectors, 'cities': args.cities, 'files': args.files,
+                       'load_workers': args.load_workers, 'dialect': dialect, 'repeat': args.repeat},
+        'environment': {'machine': platform.node(), 'platform': platform.platform(), 'python': platform.python_version(),
+                        'pandas': pd.__version__, 'sqlalchemy': sqlalchemy.__version__},
+        'stages': {name: {'seconds': round(stage['seconds'], 4), 'rows': stage['rows']} for name, stage in stages.items()},
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    Compare the stage times with the baseline.
+
+    Returns:
+        list: Names of the stages slower than their baseline beyond the tolerance.
+    """
+    parameters = {key: results['parameters'].get(key) for key in WORKLOAD_PARAMETERS}
+    baseline_parameters = {key: baseline['parameters'].get(key) for key in WORKLOAD_PARAMETERS}
+    if parameters != baseline_parameters:
+        raise ValueError(f"The baseline was recorded with {baseline_parameters}, not {parameters}")
+    if results['environment'] != baseline['environment']:
+        print(f"Warning: the baseline was recorded on {baseline['environment']}, timings may not be comparable")
+
+    regressions = []
+    print(f"{'stage':<10} {'baseline':>10} {'now':>10} {'change':>8}")
+    for name, stage in results['stages'].items():
+        reference = baseline['stages'].get(name)
+        if reference is None:
+            print(f"{name:<10} {'-':>10} {stage['seconds']:>10.4f}")
+            continue
+        change = stage['seconds'] / reference['seconds'] - 1 if reference['seconds'] else 0.0
+        regressed = change > tolerance and stage['seconds'] - reference['seconds'] > MIN_REGRESSION_SECONDS
+        print(f"{name:<10} {reference['seconds']:>10.4f} {stage['seconds']:>10.4f} {change:>+8.0%}"
+              + ("  REGRESSION" if regressed else ""))
+        if regressed:
+            regressions.append(name)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--years', type=int, default=40)
+    parser.add_argument('--sectors', type=int, default=60)
+    parser.add_argument('--cities', type=int, default=40)
+    parser.add_argument('--files', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT)
+    parser.add_argument('--database-url', help="SQLAlchemy URL of the destination, a temporary SQLite file by default")
+    parser.add_argument('--schema', help="Schema of the destination tables")
+    parser.add_argument('--load-workers', type=int, default=1)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="Allowed slowdown per stage, 0.25 = 25%%")
+    args = parser.parse_args()
+
+    work_directory = tempfile.mkdtemp(prefix='sama_bench_')
+    try:
+        results = run_benchmark(args, work_directory)
+    finally:
+        shutil.rmtree(work_directory, ignore_errors=True)
+
+    print(f"{args.files} workbook(s), {args.years} years, {args.sectors} sectors, {args.cities} cities, "
+          f"{results['parameters']['dialect']}, median of {args.repeat} runs")
+    for name, stage in results['stages'].items():
+        print(f"{name:<10} {stage['seconds']:.4f} s  {stage['rows']} rows")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+            file.write('\n')
+        print(f"Saved the baseline to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        print(f"No baseline at {args.baseline}, run with --save-baseline to record one")
+        return
+    if args.repeat < MIN_COMPARE_REPEAT:
+        print(f"Not compared with the baseline, use --repeat {MIN_COMPARE_REPEAT} or more")
+        return
+
+    with open(args.baseline, 'r', encoding='utf-8') as file:
+        baseline = json.load(file)
+    try:
+        regressions = compare(results, baseline, args.tolerance)
+    except ValueError as error:
+        print(error)
+        sys.exit(2)
+    if regressions:
+        print(f"Slower than the baseline by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+        sys.exit(1)
+    print("No regression")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,29 @@
+"""
+Loader of SAMA_refactor-V2 shared by the benchmarks and the tests.
+
+    import etl_module
+    etl = etl_module.load_etl_module()
+"""
+
+import os
+import sys
+import types
+import importlib.util
+
+CODE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Code')
+if CODE_DIRECTORY not in sys.path:
+    sys.path.insert(0, CODE_DIRECTORY)
+
+
+def load_etl_module():
+    """
+    Import SAMA_refactor-V2.py (its name is not a valid module name).
+
+    V2 imports the production connection settings (ETL_Config) at module level. The benchmarks and tests never
+    connect with them, so a stub is registered in their place and they run in a clean checkout.
+    """
+    sys.modules.setdefault('ETL_Config', types.SimpleNamespace(config={'servers': {}}))
+    spec = importlib.util.spec_from_file_location('SAMA_refactor_V2', os.path.join(CODE_DIRECTORY, 'SAMA_refactor-V2.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -0,0 +1,147 @@
+"""
+Generator of synthetic Monthly Bulletin workbooks with the layout of sheets 30c, 30d and 30e.
+
+    python Benchmarks/synthetic_bulletin.py Monthly_Bulletin_Synthetic.xlsx [--years N] [--sectors M] [--cities K]
+
+Every sheet has title rows, an empty header row (Excel row 13, HEADER_ROW of the ETL) and the 'الفترة' marker row
+with the column titles, followed by the yearly block, the quarterly block ('Q1' | 2019) and the monthly block
+(end-of-month dates), separated by blank rows and closed by a source note:
+
+- 30c: the fixed columns of the ETL mapping, with '---' placeholders for missing values
+- 30d: one (Number of transactions, Sales) pair per sector
+- 30e: one (Number of transactions, Sales, Number of terminals) triple per city, and the period repeated
+  in the last columns like the real sheet
+
+The content is random but reproducible for a seed, and scales with the years of history and the number of
+sectors and cities.
+"""
+
+import random
+import calendar
+import argparse
+from datetime import datetime
+
+from openpyxl import Workbook
+
+PERIOD_MARKER = 'الفترة'
+# Excel row of the marker (the header row of the ETL is the row above it)
+MARKER_ROW = 14
+LAST_YEAR = 2024
+# Columns (1-based) of sheet 30c holding sales, the other data columns hold counts
+COLUMNS_30C = (4, 5, 6, 8, 9, 11, 12, 14, 15)
+SALES_COLUMNS_30C = (4, 11, 12, 14)
+
+
+def period_rows(years, last_year=LAST_YEAR):
+    """
+    Return the (kind, period cells) of a sheet, in the order of the bulletin.
+
+    Returns:
+        list: (kind, [column B, column C]) with kind 'year', 'quarter', 'month', 'blank' or 'note'.
+    """
+    first_year = last_year - years + 1
+    rows = [('note', ['عدد العمليات بالآلاف', None])]
+    rows += [('year', [year, None]) for year in range(first_year, last_year + 1)]
+    rows += [('blank', [None, None])]
+    rows += [('quarter', [f'Q{quarter}', year]) for year in range(first_year, last_year + 1) for quarter in range(1, 5)]
+    rows += [('blank', [None, None])]
+    rows += [('month', [datetime(year, month, calendar.monthrange(year, month)[1]), None])
+             for year in range(first_year, last_year + 1) for month in range(1, 13)]
+    rows += [('note', ['المصدر: البنك المركزي السعودي', None])]
+    return rows
+
+
+def _sheet_top(worksheet, title, marker_titles):
+    """
+    Write the title rows, the empty rows down to the header row and the marker row.
+    """
+    worksheet.append([None, title])
+    worksheet.append([None, 'Saudi Central Bank - Monthly Statistical Bulletin'])
+    for _ in range(3, MARKER_ROW):
+        worksheet.append([])
+    marker_row = [None] * (max(marker_titles, default=2) + 1)
+    marker_row[1] = PERIOD_MARKER
+    for column, text in marker_titles.items():
+        marker_row[column - 1] = text
+    worksheet.append(marker_row)
+
+
+def make_workbook(path, years=10, sectors=18, cities=13, na_rate=0.05, seed=1, last_year=LAST_YEAR):
+    """
+    Write a synthetic Monthly Bulletin workbook.
+
+    Args:
+        path (str): Path of the .xlsx file.
+        years (int): Years of history, each giving 1 yearly, 4 quarterly and 12 monthly rows per sheet.
+        sectors (int): Sectors of sheet 30d.
+        cities (int): Cities of sheet 30e.
+        na_rate (float): Share of the 30c cells holding the '---' placeholder.
+        seed (int): Seed of the random values.
+        last_year (int): Most recent year of the history.
+
+    Returns:
+        int: Number of data rows per sheet.
+    """
+    rnd = random.Random(seed)
+    periods = period_rows(years, last_year)
+    workbook = Workbook(write_only=True)
+
+    def count():
+        return rnd.randint(0, 10 ** 7)
+
+    def sales():
+        return round(rnd.random() * 10 ** 6, 1)
+
+    worksheet = workbook.create_sheet('30c')
+    _sheet_top(worksheet, 'Points of Sale Transactions', {column: f'Title {column}' for column in COLUMNS_30C})
+    for kind, cells in periods:
+        row = [None] + cells + [None] * (COLUMNS_30C[-1] - 3)
+        if kind in ('year', 'quarter', 'month'):
+            for column in COLUMNS_30C:
+                row[column - 1] = '---' if rnd.random() < na_rate else sales() if column in SALES_COLUMNS_30C else count()
+        worksheet.append(row)
+
+    worksheet = workbook.create_sheet('30d')
+    _sheet_top(worksheet, 'POS Transactions by Sectors',
+               {4 + 2 * sector: f'Sector {sector} & Services* ' for sector in range(sectors)})
+    for kind, cells in periods:
+        row = [None] + cells
+        if kind in ('year', 'quarter', 'month'):
+            for _ in range(sectors):
+                row += [count(), sales()]
+        worksheet.append(row)
+
+    last_column = 4 + 3 * cities
+    titles = {4 + 3 * city: f'City-{city} ' for city in range(cities)}
+    titles[last_column] = PERIOD_MARKER
+    worksheet = workbook.create_sheet('30e')
+    _sheet_top(worksheet, 'POS Transactions by Main Cities', titles)
+    for kind, cells in periods:
+        row = [None] + cells
+        if kind in ('year', 'quarter', 'month'):
+            for _ in range(cities):
+                row += [count(), sales(), count()]
+            row += [str(cells[0]), str(cells[1])]
+        worksheet.append(row)
+
+    # a sheet the ETL does not read
+    workbook.create_sheet('30a').append(['Other table'])
+    workbook.save(path)
+    return sum(1 for kind, _ in periods if kind in ('year', 'quarter', 'month'))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('path')
+    parser.add_argument('--years', type=int, default=10)
+    parser.add_argument('--sectors', type=int, default=18)
+    parser.add_argument('--cities', type=int, default=13)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rows = make_workbook(args.path, args.years, args.sectors, args.cities, seed=args.seed)
+    print(f"Wrote {args.path}: {rows} data rows per sheet")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""
+Backfill past SAMA Monthly Bulletins.
+
+The daily scraper (Scraping_SAMA_Data.py) only downloads the first .xlsx link of the Monthly Statistics page.
+This script downloads every bulletin linked on the page, or the URLs given on the command line, concurrently:
+
+    python Backfill_SAMA_Data.py                      # every .xlsx link of the Monthly Statistics page
+    python Backfill_SAMA_Data.py <url> [<url> ...]    # only the given workbooks
+
+Downloads share one pooled ScraperClient, are rate limited per host (every request, Range resumes and retries
+included), retried with exponential backoff and deduplicated by content against the archive manifest exactly like
+the daily scraper. Workbooks with the same file name under different paths are saved under distinct names.
+"""
+
+import os
+import sys
+import time
+import hashlib
+import logging
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
+
+import requests
+
+import Scraping_SAMA_Data as s
+
+logging.basicConfig(level=logging.INFO)
+
+# Maximum number of workbooks downloaded at the same time
+MAX_WORKERS = 4
+# Minimum number of seconds between two requests sent to the same host
+MIN_REQUEST_INTERVAL = 1.0
+# Number of retries of a failed download and base delay in seconds of the exponential backoff
+MAX_RETRIES = s.MAX_RETRIES
+BACKOFF_FACTOR = s.BACKOFF_FACTOR
+
+
+class HostRateLimiter:
+    """
+    Thread-safe limiter allowing one request per host every `min_interval` seconds.
+    """
+
+    def __init__(self, min_interval: float = MIN_REQUEST_INTERVAL):
+        self.min_interval = min_interval
+        self._next_slot = {}
+        self._lock = threading.Lock()
+
+    def wait(self, url: str):
+        """
+        Block until a request to the host of `url` is allowed.
+        """
+        host = urlparse(url).netloc
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot.get(host, now))
+            self._next_slot[host] = slot + self.min_interval
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+
+def local_file_names(urls):
+    """
+    Return url -> local file name. Names shared by several URLs (same file name under different paths) get a
+    suffix from the URL hash, so concurrent downloads never write to the same '.part' file.
+    """
+    names = {url: s.file_name_from_url(url) for url in urls}
+    counts = Counter(names.values())
+    for url, name in names.items():
+        if counts[name] > 1:
+            stem, extension = os.path.splitext(name)
+            names[url] = f"{stem}_{hashlib.sha256(url.encode('utf-8')).hexdigest()[:8]}{extension}"
+    return names
+
+
+def download_with_retry(client, file_url, save_directory, archive_directory,
+                        max_retries=MAX_RETRIES, backoff_factor=BACKOFF_FACTOR, file_name=None):
+    """
+    Download one workbook, retrying failed attempts with exponential backoff.
+
+    Error statuses and connection errors are retried by the client itself; this retries the whole download
+    when it still fails or stays incomplete after all its Range resumes.
+
+    Args:
+    - client (Scraping_SAMA_Data.ScraperClient): Shared pooled client, rate limited per host.
+    - file_url (str): URL of the workbook.
+    - save_directory (str): Directory where the workbook is saved.
+    - archive_directory (str): The 'Archive' directory holding the manifest.
+    - max_retries (int): Number of retries after the first attempt.
+    - backoff_factor (float): Base delay in seconds, attempt n waits backoff_factor * 2 ** (n - 1).
+    - file_name (str, optional): Local file name, by default the file name of the URL.
+
+    Returns:
+    - local_file_path (str): Path of the new workbook, None if its content is already archived.
+    """
+    local_file_path = os.path.join(save_directory, file_name or s.file_name_from_url(file_url))
+
+    for attempt in range(max_retries + 1):
+        try:
+            s.stream_download_file(file_url, local_file_path, {}, session=client, backoff_factor=backoff_factor)
+            return s.register_download(local_file_path, file_url, archive_directory)
+        except requests.exceptions.HTTPError:
+            # already retried by the client
+            raise
+        except (requests.exceptions.RequestException, IOError) as error:
+            if attempt == max_retries:
+                raise
+            delay = backoff_factor * 2 ** attempt
+            logging.warning(f"Retrying {file_url} in {delay:.1f}s ({attempt + 1}/{max_retries}): {error}")
+            time.sleep(delay)
+
+
+def backfill_sama_xlsx_files(save_directory, archive_directory, urls=None, max_workers=MAX_WORKERS,
+                             min_request_interval=MIN_REQUEST_INTERVAL, max_retries=MAX_RETRIES,
+                             backoff_factor=BACKOFF_FACTOR, page_url=s.SAMA_URL, rate_limiter=None):
+    """
+    Download many Monthly Bulletin workbooks concurrently.
+
+    Args:
+    - save_directory (str): Directory where the workbooks are saved.
+    - archive_directory (str): The 'Archive' directory holding the manifest.
+    - urls (list, optional): Workbook URLs; by default every .xlsx link of `page_url`.
+    - max_workers (int): Number of concurrent downloads.
+    - min_request_interval (float): Minimum seconds between two requests to the same host.
+    - max_retries (int): Number of retries of a failed download.
+    - backoff_factor (float): Base delay in seconds of the exponential backoff.
+    - page_url (str): Page listing the bulletins.
+    - rate_limiter (HostRateLimiter, optional): Limiter of every request, by default one allowing a request
+                                                per host every `min_request_interval` seconds.
+
+    Returns:
+    - results (dict): url -> local file path, None if already archived, or the raised exception.
+    """
+    os.makedirs(archive_directory, exist_ok=True)
+    rate_limiter = rate_limiter or HostRateLimiter(min_request_interval)
+    results = {}
+
+    with s.ScraperClient(max_retries=max_retries, backoff_factor=backoff_factor, pool_size=max_workers,
+                         rate_limiter=rate_limiter) as client:
+        if not urls:
+            response = client.get(page_url)
+            response.raise_for_status()
+            urls = s.find_xlsx_links(response.content, page_url)
+            logging.info(f"Found {len(urls)} .xlsx links on {page_url}")
+
+        file_names = local_file_names(dict.fromkeys(urls))
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(download_with_retry, client, url, save_directory, archive_directory,
+                                max_retries, backoff_factor, file_name): url
+                for url, file_name in file_names.items()
+            }
+            for future in as_completed(futures):
+                url = futures[future]
+                try:
+                    results[url] = future.result()
+                except Exception as error:
+                    logging.error(f"Error downloading {url}: {error}")
+                    results[url] = error
+
+        logging.info(f"HTTP request latency (seconds): {client.latency_summary()}")
+
+    downloaded = sum(1 for result in results.values() if isinstance(result, str))
+    failed = sum(1 for result in results.values() if isinstance(result, Exception))
+    logging.info(f"Backfill finished: {downloaded} downloaded, {len(results) - downloaded - failed} already archived, {failed} failed.")
+    return results
+
+
+if __name__ == '__main__':
+    save_directory = os.getcwd()
+    archive_directory = os.path.join(save_directory, 'Archive')
+
+    results = backfill_sama_xlsx_files(save_directory, archive_directory, urls=sys.argv[1:])
+    sys.exit(1 if any(isinstance(result, Exception) for result in results.values()) else 0)
@@ -3,16 +3,40 @@ This script provides utility functions for database operations across SQL Server
 It includes functionalities to connect to databases, read and manipulate data, and maintain load frequency counts.
 """
 
+import io
+import json
+import atexit
+import threading
 import urllib.parse
+from contextlib import contextmanager
 import sqlalchemy
 from sqlalchemy import create_engine, text, literal_column
 import pandas as pd
+import numpy as np
 import logging
 import mysql.connector 
 import psycopg2
 
 import ETL_Config as c
 
+# Number of rows sent per batch by the bulk loaders
+BULK_CHUNK_SIZE = 10000
+
+# Table of ByDB receiving the stage metrics of the ETL runs (see Insert_Stage_Metrics)
+STAGE_METRICS_TABLE = 'ByDB.[General].ETL_Stage_Metrics'
+
+# Connection pool of the SQL Server engines: connections kept open, extra connections allowed under load,
+# check of a connection before reusing it, and age in seconds after which a connection is reopened
+# (below the idle timeout of the servers and firewalls)
+POOL_SIZE = 5
+MAX_OVERFLOW = 5
+POOL_PRE_PING = True
+POOL_RECYCLE = 1800
+
+# Engines shared by the whole process, one per server, database and user (see get_engine)
+_engines = {}
+_engines_lock = threading.Lock()
+
 
 def Connect_TO_SQL(TargetServer: str, TargetDb: str, username: str, password: str) -> sqlalchemy.engine.Engine:
     """
@@ -32,12 +56,89 @@ def Connect_TO_SQL(TargetServer: str, TargetDb: str, username: str, password: st
             f"DRIVER={{SQL Server}};SERVER={TargetServer};DATABASE={TargetDb};UID={username};PWD={password}"
         )
         conn_str = f"mssql+pyodbc:///?odbc_connect={params}"
-        return create_engine(conn_str, encoding="utf-8")
+        return create_engine(conn_str, encoding="utf-8", pool_size=POOL_SIZE, max_overflow=MAX_OVERFLOW,
+                             pool_pre_ping=POOL_PRE_PING, pool_recycle=POOL_RECYCLE)
     except Exception as e:
         logging.exception("Error connecting to SQL Server: %s", e)
         raise
 
 
+def get_engine(config_key: str) -> sqlalchemy.engine.Engine:
+    """
+    Return the pooled engine of a server configuration, created on first use and shared afterwards.
+
+    Configuration keys pointing to the same server, database and user share one engine, so a run reuses the
+    pooled ODBC connections instead of logging in again for every table.
+
+    Args:
+        config_key (str): Key of the server in ETL_Config.
+
+    Returns:
+        sqlalchemy.engine.Engine: The shared engine.
+    """
+    config = c.config["servers"][config_key]
+    engine_key = (config["server"], config["database"], config["username"])
+    with _engines_lock:
+        if engine_key not in _engines:
+            _engines[engine_key] = Connect_TO_SQL(config["server"], config["database"],
+                                                  config["username"], config["password"])
+        return _engines[engine_key]
+
+
+def dispose_engines():
+    """
+    Close the pooled connections of every shared engine, registered to run at interpreter exit.
+    """
+    with _engines_lock:
+        for engine in _engines.values():
+            engine.dispose()
+        _engines.clear()
+
+
+atexit.register(dispose_engines)
+
+
+def _bind(target):
+    """
+    Return the engine of a configuration key, or `target` itself when it already is an engine or connection.
+    """
+    return get_engine(target) if isinstance(target, str) else target
+
+
+@contextmanager
+def connection_scope(target):
+    """
+    Context manager giving a pooled connection, returned to the pool at the end of the block.
+
+    Args:
+        target: Configuration key, engine, or an open connection (used as is and left open).
+    """
+    target = _bind(target)
+    if isinstance(target, sqlalchemy.engine.Connection):
+        yield target
+        return
+    with target.connect() as connection:
+        yield connection
+
+
+@contextmanager
+def transaction_scope(target):
+    """
+    Context manager giving a pooled connection inside a transaction, committed at the end of the block
+    and rolled back if it raises.
+
+    Args:
+        target: Configuration key, engine, or an open connection (a transaction is started on it).
+    """
+    target = _bind(target)
+    if isinstance(target, sqlalchemy.engine.Connection):
+        with target.begin():
+            yield target
+        return
+    with target.begin() as connection:
+        yield connection
+
+
 # connect to destinations 
 def connect_to_databases(dest_config_key: str, dmdq_config_key: str):
     """
@@ -50,13 +151,8 @@ def connect_to_databases(dest_config_key: str, dmdq_config_key: str):
         tuple: Tuple containing engine objects for DM_Quality and the specified Destination database.
     """
     try:
-        config_DMDQ = c.config["servers"][dmdq_config_key]
-        Engine_DMDQ = Connect_TO_SQL(config_DMDQ["server"], config_DMDQ["database"], 
-                                     config_DMDQ["username"], config_DMDQ["password"])
-
-        config_dest = c.config["servers"][dest_config_key]
-        Engine_Dest = Connect_TO_SQL(config_dest["server"], config_dest["database"], 
-                                     config_dest["username"], config_dest["password"])
+        Engine_DMDQ = get_engine(dmdq_config_key)
+        Engine_Dest = get_engine(dest_config_key)
 
         return Engine_DMDQ, Engine_Dest
     except Exception as e:
@@ -131,9 +227,7 @@ def create_mssql_connection(config_key: str):
     """
     try:
 
-        config_src = c.config["servers"][config_key]
-        Engine_src = Connect_TO_SQL(config_src["server"], config_src["database"], 
-                                     config_src["username"], config_src["password"])
+        Engine_src = get_engine(config_key)
 
         return  Engine_src
     except Exception as e:
@@ -155,6 +249,54 @@ def read_source_data(table_name: str, connection) -> pd.DataFrame:
     return pd.read_sql(query, connection)
 
 
+def downcast_dataframe(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Shrink the numeric columns of a DataFrame without changing any value: integers to the smallest integer type
+    holding them, floats to float32 only when every value survives the round trip.
+
+    Each chunk is downcast on its own values, so two chunks of a table may get different integer widths.
+    """
+    for column in df.columns:
+        series = df[column]
+        if pd.api.types.is_integer_dtype(series) and not pd.api.types.is_extension_array_dtype(series):
+            df[column] = pd.to_numeric(series, downcast='integer')
+        elif pd.api.types.is_float_dtype(series) and series.dtype == np.float64:
+            narrow = series.astype(np.float32)
+            if ((narrow.astype(np.float64) == series) | series.isna()).all():
+                df[column] = narrow
+    return df
+
+
+def read_source_data_chunks(table_name: str, connection, columns: list = None, where: str = None, params: dict = None,
+                            chunk_size: int = BULK_CHUNK_SIZE, downcast: bool = False):
+    """
+    Stream a source table as DataFrames of `chunk_size` rows instead of loading it whole like `read_source_data`.
+
+    The query runs with a server-side cursor (stream_results) where the driver supports one, so only one chunk is
+    held in memory at a time. The chunks can be given straight to `bulk_load_chunks`.
+
+    Args:
+        table_name (str): Name of the source table.
+        connection: Database connection, engine or configuration key.
+        columns (list, optional): Columns to read, all by default.
+        where (str, optional): Predicate with bound parameters, e.g. "LoadDate > :watermark".
+        params (dict, optional): Values of the bound parameters of `where`.
+        chunk_size (int): Number of rows per DataFrame.
+        downcast (bool): Downcast the numeric columns of each chunk (see `downcast_dataframe`).
+
+    Yields:
+        pd.DataFrame: The next chunk of rows.
+    """
+    query = f"SELECT {', '.join(columns) if columns else '*'} FROM {table_name}"
+    if where:
+        query += f" WHERE {where}"
+
+    with connection_scope(connection) as source:
+        streaming = source.execution_options(stream_results=True)
+        for chunk in pd.read_sql(text(query), streaming, params=params or {}, chunksize=chunk_size):
+            yield downcast_dataframe(chunk) if downcast else chunk
+
+
 def read_database_count(db_name: str, schema_name: str, table_name: str, con):
     """
     Executes a SELECT count(*) query for a given table and returns results.
@@ -176,6 +318,335 @@ def read_database_count(db_name: str, schema_name: str, table_name: str, con):
         raise
 
 
+def _dataframe_rows(df: pd.DataFrame, chunk_size: int):
+    """
+    Yield the rows of a DataFrame as lists of tuples of Python values (None for missing values), `chunk_size` rows at a time.
+    """
+    columns = []
+    for position in range(df.shape[1]):
+        series = df.iloc[:, position]
+        if pd.api.types.is_datetime64_any_dtype(series):
+            # plain datetime objects, some drivers reject the pd.Timestamp subclass
+            values = np.array(series.dt.to_pydatetime(), dtype=object)
+        else:
+            values = series.to_numpy(dtype=object)
+        values[series.isna().to_numpy()] = None
+        columns.append(values.tolist())
+    rows = list(zip(*columns))
+    for start in range(0, len(rows), chunk_size):
+        yield rows[start:start + chunk_size]
+
+
+def _qualified_name(bind, table_name: str, schema: str = None) -> str:
+    """
+    Quote a table name, and its schema if given, for the database of an engine or connection.
+    """
+    preparer = bind.dialect.identifier_preparer
+    if schema is None:
+        return preparer.quote(table_name)
+    return f"{preparer.quote_schema(schema)}.{preparer.quote(table_name)}"
+
+
+def _quoted_columns(bind, columns) -> str:
+    return ', '.join(bind.dialect.identifier_preparer.quote(str(column)) for column in columns)
+
+
+def _insert_query(bind, target: str, columns, suffix: str = '') -> str:
+    """
+    Build an INSERT ... VALUES statement for a quoted target with the parameter style of the driver.
+    """
+    placeholder = '?' if bind.dialect.paramstyle == 'qmark' else '%s'
+    return f"INSERT INTO {target} ({_quoted_columns(bind, columns)}) VALUES ({', '.join([placeholder] * len(columns))}){suffix}"
+
+
+def _executemany_rows(cursor, query: str, df: pd.DataFrame, chunk_size: int) -> int:
+    """
+    Run a DB-API executemany of `query` for every chunk of rows, returning the row count reported by the driver.
+    """
+    row_count = 0
+    for rows in _dataframe_rows(df, chunk_size):
+        cursor.executemany(query, rows)
+        row_count += max(cursor.rowcount, 0)
+    return row_count
+
+
+def _copy_rows(cursor, copy_query: str, df: pd.DataFrame, chunk_size: int):
+    """
+    Stream the rows to a psycopg2 COPY ... FROM STDIN (CSV) statement, one buffer per chunk.
+    """
+    for start in range(0, len(df), chunk_size):
+        buffer = io.StringIO()
+        df.iloc[start:start + chunk_size].to_csv(buffer, header=False, index=False, na_rep='\\N')
+        buffer.seek(0)
+        cursor.copy_expert(copy_query, buffer)
+
+
+def _copy_query(bind, target: str, columns) -> str:
+    return f"COPY {target} ({_quoted_columns(bind, columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')"
+
+
+def _executemany_load(df: pd.DataFrame, table_name: str, schema: str, engine: sqlalchemy.engine.Engine, chunk_size: int,
+                      fast_executemany: bool = False):
+    """
+    Insert the rows with the DB-API executemany of the engine's driver, one call per chunk and one transaction per table.
+    """
+    insert_query = _insert_query(engine, _qualified_name(engine, table_name, schema), df.columns)
+    connection = engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        if fast_executemany:
+            cursor.fast_executemany = True
+        _executemany_rows(cursor, insert_query, df, chunk_size)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+
+def _bulk_load_mssql(df: pd.DataFrame, table_name: str, schema: str, engine: sqlalchemy.engine.Engine, chunk_size: int):
+    """
+    SQL Server: pyodbc executemany with fast_executemany, which sends each chunk as one array of parameters.
+    """
+    _executemany_load(df, table_name, schema, engine, chunk_size, fast_executemany=True)
+
+
+def _bulk_load_postgresql(df: pd.DataFrame, table_name: str, schema: str, engine: sqlalchemy.engine.Engine, chunk_size: int):
+    """
+    PostgreSQL: psycopg2 COPY ... FROM STDIN, each chunk streamed as CSV.
+    """
+    connection = engine.raw_connection()
+    try:
+        _copy_rows(connection.cursor(), _copy_query(engine, _qualified_name(engine, table_name, schema), df.columns),
+                   df, chunk_size)
+        connection.commit()
+    except Exception:
+        connection.rollback()
+        raise
+    finally:
+        connection.close()
+
+
+def _bulk_load_mysql(df: pd.DataFrame, table_name: str, schema: str, engine: sqlalchemy.engine.Engine, chunk_size: int):
+    """
+    MySQL: batched executemany, which the MySQL drivers rewrite into one multi-row INSERT per chunk.
+    LOAD DATA LOCAL INFILE is not used, local_infile is disabled on the servers by default.
+    """
+    _executemany_load(df, table_name, schema, engine, chunk_size)
+
+
+def _bulk_load_default(df: pd.DataFrame, table_name: str, schema: str, engine: sqlalchemy.engine.Engine, chunk_size: int):
+    """
+    Other databases: SQLAlchemy executemany through pandas, `chunk_size` rows per batch.
+    """
+    df.to_sql(table_name, con=engine, schema=schema, if_exists='append', index=False, chunksize=chunk_size)
+
+
+# Bulk loader of each SQLAlchemy dialect, other dialects use _bulk_load_default
+BULK_LOADERS = {
+    'mssql': _bulk_load_mssql,
+    'postgresql': _bulk_load_postgresql,
+    'mysql': _bulk_load_mysql,
+}
+
+
+def bulk_load_dataframe(df: pd.DataFrame, table_name: str, engine: sqlalchemy.engine.Engine, schema: str = None,
+                        if_exists: str = 'replace', chunk_size: int = BULK_CHUNK_SIZE) -> int:
+    """
+    Load a DataFrame into a table with the bulk loader of the engine's database.
+
+    The table is created (or replaced) from the DataFrame's columns like `df.to_sql` does, then the rows are
+    sent in chunks by the loader chosen from the engine dialect in BULK_LOADERS.
+
+    Args:
+        df (pd.DataFrame): Data to load.
+        table_name (str): Destination table.
+        engine (sqlalchemy.engine.Engine): Engine of the destination database.
+        schema (str, optional): Schema of the table.
+        if_exists (str): 'replace' to recreate the table, 'append' to add to it (it is created if missing).
+        chunk_size (int): Number of rows per batch.
+
+    Returns:
+        int: Number of rows loaded.
+    """
+    try:
+        df.head(0).to_sql(table_name, con=engine, schema=schema, if_exists=if_exists, index=False)
+        if df.empty:
+            return 0
+        loader = BULK_LOADERS.get(engine.dialect.name, _bulk_load_default)
+        loader(df, table_name, schema, engine, chunk_size)
+        return len(df)
+    except Exception as e:
+        logging.exception("Error bulk loading into %s: %s", table_name, e)
+        raise
+
+
+def bulk_load_chunks(chunks, table_name: str, engine: sqlalchemy.engine.Engine, schema: str = None,
+                     if_exists: str = 'replace', chunk_size: int = BULK_CHUNK_SIZE) -> int:
+    """
+    Bulk load an iterable of DataFrames (e.g. `read_source_data_chunks`) into one table, one chunk in memory at a time.
+
+    The first chunk creates or replaces the table according to `if_exists`, the next ones are appended.
+
+    Returns:
+        int: Total number of rows loaded.
+    """
+    total_rows = 0
+    for position, chunk in enumerate(chunks):
+        if position == 0:
+            # create the table from the widest numeric types, a downcast first chunk would give columns too narrow
+            # for the next chunks
+            widest = {column: 'int64' if pd.api.types.is_integer_dtype(dtype) else 'float64'
+                      for column, dtype in chunk.dtypes.items()
+                      if isinstance(dtype, np.dtype) and dtype.kind in 'iuf'}
+            chunk.head(0).astype(widest).to_sql(table_name, con=engine, schema=schema, if_exists=if_exists, index=False)
+        total_rows += bulk_load_dataframe(chunk, table_name, engine, schema=schema, if_exists='append', chunk_size=chunk_size)
+    logging.info(f"Bulk loaded {total_rows} rows into {table_name}")
+    return total_rows
+
+
+def _upsert_mssql(connection, df: pd.DataFrame, table_name: str, schema: str, key_columns: list,
+                  update_existing: bool, chunk_size: int) -> int:
+    """
+    SQL Server: rows staged in a session #temp table with fast_executemany, then one MERGE ... WITH (HOLDLOCK).
+    """
+    quote = connection.dialect.identifier_preparer.quote
+    target = _qualified_name(connection, table_name, schema)
+    columns = _quoted_columns(connection, df.columns)
+    update_columns = [column for column in df.columns if column not in key_columns]
+
+    connection.execute(f"SELECT TOP 0 {columns} INTO #upsert_stage FROM {target}")
+    cursor = connection.connection.cursor()
+    cursor.fast_executemany = True
+    _executemany_rows(cursor, _insert_query(connection, '#upsert_stage', df.columns), df, chunk_size)
+
+    when_matched = ''
+    if update_existing and update_columns:
+        when_matched = "WHEN MATCHED THEN UPDATE SET " + ', '.join(f"main.{quote(column)} = stage.{quote(column)}"
+                                                                   for column in update_columns)
+    result = connection.execute(f"""
+        MERGE {target} WITH (HOLDLOCK) AS main
+        USING #upsert_stage AS stage
+        ON {' AND '.join(f"main.{quote(column)} = stage.{quote(column)}" for column in key_columns)}
+        {when_matched}
+        WHEN NOT MATCHED BY TARGET THEN
+            INSERT ({columns}) VALUES ({', '.join(f"stage.{quote(column)}" for column in df.columns)});
+    """)
+    connection.execute("DROP TABLE #upsert_stage")
+    return result.rowcount
+
+
+def _upsert_postgresql(connection, df: pd.DataFrame, table_name: str, schema: str, key_columns: list,
+                       update_existing: bool, chunk_size: int) -> int:
+    """
+    PostgreSQL: rows copied into a temporary table dropped at commit, then one INSERT ... ON CONFLICT.
+    The key columns need a unique index or constraint on the destination table.
+    """
+    quote = connection.dialect.identifier_preparer.quote
+    target = _qualified_name(connection, table_name, schema)
+    columns = _quoted_columns(connection, df.columns)
+    update_columns = [column for column in df.columns if column not in key_columns]
+
+    connection.execute(f"CREATE TEMP TABLE upsert_stage ON COMMIT DROP AS SELECT {columns} FROM {target} WITH NO DATA")
+    _copy_rows(connection.connection.cursor(), _copy_query(connection, 'upsert_stage', df.columns), df, chunk_size)
+
+    action = 'DO NOTHING'
+    if update_existing and update_columns:
+        action = "DO UPDATE SET " + ', '.join(f"{quote(column)} = EXCLUDED.{quote(column)}" for column in update_columns)
+    result = connection.execute(f"""
+        INSERT INTO {target} ({columns})
+        SELECT {columns} FROM upsert_stage
+        ON CONFLICT ({_quoted_columns(connection, key_columns)}) {action}
+    """)
+    return result.rowcount
+
+
+def _upsert_mysql(connection, df: pd.DataFrame, table_name: str, schema: str, key_columns: list,
+                  update_existing: bool, chunk_size: int) -> int:
+    """
+    MySQL: batched INSERT ... ON DUPLICATE KEY UPDATE, no staging table needed.
+    The key columns need a unique index on the destination table; without update_existing the key is set to itself,
+    which keeps the existing row.
+    """
+    quote = connection.dialect.identifier_preparer.quote
+    update_columns = [column for column in df.columns if column not in key_columns]
+    if update_existing and update_columns:
+        assignments = ', '.join(f"{quote(column)} = VALUES({quote(column)})" for column in update_columns)
+    else:
+        assignments = f"{quote(key_columns[0])} = {quote(key_columns[0])}"
+    insert_query = _insert_query(connection, _qualified_name(connection, table_name, schema), df.columns,
+                                 f" ON DUPLICATE KEY UPDATE {assignments}")
+    return _executemany_rows(connection.connection.cursor(), insert_query, df, chunk_size)
+
+
+def _upsert_default(connection, df: pd.DataFrame, table_name: str, schema: str, key_columns: list,
+                    update_existing: bool, chunk_size: int) -> int:
+    """
+    Other databases (e.g. SQLite): an executemany UPDATE of the existing rows when update_existing,
+    then an executemany INSERT ... SELECT ... WHERE NOT EXISTS of the new ones.
+    """
+    quote = connection.dialect.identifier_preparer.quote
+    placeholder = '?' if connection.dialect.paramstyle == 'qmark' else '%s'
+    target = _qualified_name(connection, table_name, schema)
+    update_columns = [column for column in df.columns if column not in key_columns]
+    key_condition = ' AND '.join(f"{quote(column)} = {placeholder}" for column in key_columns)
+    cursor = connection.connection.cursor()
+
+    row_count = 0
+    if update_existing and update_columns:
+        update_query = (f"UPDATE {target} SET {', '.join(f'{quote(column)} = {placeholder}' for column in update_columns)} "
+                        f"WHERE {key_condition}")
+        row_count += _executemany_rows(cursor, update_query, df[update_columns + key_columns], chunk_size)
+
+    insert_query = (f"INSERT INTO {target} ({_quoted_columns(connection, df.columns)}) "
+                    f"SELECT {', '.join([placeholder] * len(df.columns))} "
+                    f"WHERE NOT EXISTS (SELECT 1 FROM {target} WHERE {key_condition})")
+    row_count += _executemany_rows(cursor, insert_query, df[list(df.columns) + key_columns], chunk_size)
+    return row_count
+
+
+# Upsert loader of each SQLAlchemy dialect, other dialects use _upsert_default
+UPSERT_LOADERS = {
+    'mssql': _upsert_mssql,
+    'postgresql': _upsert_postgresql,
+    'mysql': _upsert_mysql,
+}
+
+
+def upsert_dataframe(df: pd.DataFrame, table_name: str, engine: sqlalchemy.engine.Engine, key_columns: list,
+                     schema: str = None, update_existing: bool = False, chunk_size: int = BULK_CHUNK_SIZE) -> int:
+    """
+    Insert the rows of a DataFrame whose key is not in a table yet, and optionally update the others,
+    in one transaction on one connection.
+
+    The loader is chosen from the engine dialect in UPSERT_LOADERS: MERGE from a session #temp table on SQL Server,
+    INSERT ... ON CONFLICT on PostgreSQL, INSERT ... ON DUPLICATE KEY on MySQL. Staging tables are session-scoped,
+    so a crash never leaves one behind, and a failure rolls back the whole table.
+
+    Args:
+        df (pd.DataFrame): Data to load, its columns must exist in the table.
+        table_name (str): Destination table.
+        engine (sqlalchemy.engine.Engine): Engine of the destination database.
+        key_columns (list): Columns identifying a row, e.g. ['Period'] or ['Yearnum', 'Qurternum'].
+        schema (str, optional): Schema of the table.
+        update_existing (bool): Also overwrite the rows whose key already exists (revised values).
+        chunk_size (int): Number of rows per batch sent to the staging table.
+
+    Returns:
+        int: Number of rows inserted or updated as reported by the driver (-1 when it does not report it).
+    """
+    if df.empty:
+        return 0
+    try:
+        upsert = UPSERT_LOADERS.get(engine.dialect.name, _upsert_default)
+        with engine.begin() as connection:
+            return upsert(connection, df, table_name, schema, list(key_columns), update_existing, chunk_size)
+    except Exception as e:
+        logging.exception("Error upserting into %s: %s", table_name, e)
+        raise
+
+
 def truncate_table(engine: sqlalchemy.engine.Engine, Db: str, schema: str, table: str):
     """
     Truncates the specified table in the database.
@@ -187,8 +658,8 @@ def truncate_table(engine: sqlalchemy.engine.Engine, Db: str, schema: str, table
         table (str): Table name.
     """
     try:
-        connection = engine.connect().execution_options(isolation_level="AUTOCOMMIT") 
-        connection.execute(f"TRUNCATE TABLE {Db}.{schema}.{table}")
+        with engine.connect() as connection:
+            connection.execution_options(isolation_level="AUTOCOMMIT").execute(f"TRUNCATE TABLE {Db}.{schema}.{table}")
     except Exception as e:
         logging.exception("Error truncating table: %s", e)
         raise
@@ -199,7 +670,7 @@ def Generate_Frequency_of_load(engine, source_table) -> int:
     Generates and updates load frequency count for a specified table.
     
     Args:
-        engine: SQLAlchemy engine connected to the database.
+        engine: SQLAlchemy engine connected to the database, or an open connection (e.g. from `transaction_scope`).
         source_table (str): Name of the source table.
 
     Returns:
@@ -211,7 +682,7 @@ def Generate_Frequency_of_load(engine, source_table) -> int:
         WHERE DB_Table = :source_table
     """)
 
-    with engine.connect() as connection:
+    with connection_scope(engine) as connection:
         result = connection.execute(query, source_table=source_table)
         row = result.mappings().first()
         count = 0
@@ -242,7 +713,7 @@ def Insert_TO_DMDQ(Engine_DMDQ, db_name: str, db_schema: str, db_table: str,
     Inserts a record into the DM_Quality table.
     
     Args:
-        Engine_DMDQ: SQLAlchemy engine connected to DM_Quality.
+        Engine_DMDQ: SQLAlchemy engine connected to DM_Quality, or an open connection (e.g. from `transaction_scope`).
         db_name (str): Database name.
         db_schema (str): Schema name.
         db_table (str): Table name.
@@ -268,5 +739,107 @@ def Insert_TO_DMDQ(Engine_DMDQ, db_name: str, db_schema: str, db_table: str,
         logging.exception("Error inserting to DM_Quality: %s", e)
         raise
 
+def Generate_Frequency_of_loads(connection, source_tables: list) -> dict:
+    """
+    Generate and update the load frequency counts of many tables with one set-based MERGE.
+
+    Existing counters are incremented and missing ones start at 1, like `Generate_Frequency_of_load`,
+    but in a single statement: the new counts come back through OUTPUT, and HOLDLOCK keeps two concurrent
+    runs from reading the same Max_Load_Count.
+
+    Args:
+        connection: Open connection to the DM_Quality server, inside the caller's transaction.
+        source_tables (list): Names of the tables.
+
+    Returns:
+        dict: Table name -> next load count.
+    """
+    source_tables = list(dict.fromkeys(source_tables))
+    if not source_tables:
+        return {}
+
+    values = ', '.join(f"(:table_{position})" for position in range(len(source_tables)))
+    query = text(f"""
+        MERGE ByDB.[General].Frequency_of_load_count WITH (HOLDLOCK) AS target
+        USING (VALUES {values}) AS source (DB_Table)
+        ON target.DB_Table = source.DB_Table
+        WHEN MATCHED THEN
+            UPDATE SET Max_Load_Count = target.Max_Load_Count + 1
+        WHEN NOT MATCHED BY TARGET THEN
+            INSERT (DB_Table, Max_Load_Count, Insertion_date) VALUES (source.DB_Table, 1, GETDATE())
+        OUTPUT inserted.DB_Table, inserted.Max_Load_Count;
+    """)
+    result = connection.execute(query, {f"table_{position}": table for position, table in enumerate(source_tables)})
+    return {row[0]: int(row[1]) for row in result.fetchall()}
+
+
+def Insert_TO_DMDQ_batch(connection, records: list):
+    """
+    Insert many records into the DM_Quality table with one executemany on the connection's cursor.
+
+    Args:
+        connection: Open connection to the DM_Quality server, inside the caller's transaction.
+        records (list): Tuples in the order of the `Insert_TO_DMDQ` arguments after the engine:
+            (db_name, db_schema, db_table, Time_of_exe, cols, rows, count, date, src_table, src_type, no_of_rejected_rows).
+    """
+    if not records:
+        return
+    try:
+        query = """
+              INSERT INTO ByDB.[General].DM_Quality (DB_Name,DB_Schema,DB_Table,Time_of_execution,Number_of_Columns,Number_of_Rows,Frequency_of_load,STG_CreatedDate,SRC_Table,SRC_Type,Number_of_Rejected_Rows)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?,?, ?, ?)
+        """
+        # pyodbc sends all the records as one parameter array with fast_executemany, not one round trip per record
+        cursor = connection.connection.cursor()
+        if hasattr(cursor, 'fast_executemany'):
+            cursor.fast_executemany = True
+        cursor.executemany(query, [tuple(record) for record in records])
+    except Exception as e:
+        logging.exception("Error inserting to DM_Quality: %s", e)
+        raise
+
+def Insert_Stage_Metrics(connection, records: list, table: str = STAGE_METRICS_TABLE):
+    """
+    Insert the stage records of a run (see `ETL_instrumentation.stage`) into the stage metrics table of ByDB.
+
+    The table is created once by the DBA:
+
+        CREATE TABLE ByDB.[General].ETL_Stage_Metrics (
+            Run_Id varchar(40), Stage varchar(50), Stage_Object nvarchar(255), Status varchar(10),
+            Started_At datetime2, Wall_Seconds float, Cpu_Seconds float, Cpu_Scope varchar(10),
+            Peak_RSS_MB float, RSS_Delta_MB float, Number_of_Rows bigint, Number_of_Bytes bigint,
+            Error_Message nvarchar(max), Details nvarchar(max))
+
+    Args:
+        connection: Open connection to the ByDB server, inside the caller's transaction.
+        records (list): Stage records (dicts).
+        table (str): Name of the metrics table.
+    """
+    if not records:
+        return
+    known = {'run_id', 'stage', 'status', 'started_at', 'wall_seconds', 'cpu_seconds', 'cpu_scope',
+             'peak_rss_mb', 'rss_delta_mb', 'rows', 'bytes', 'error'}
+    rows = []
+    for record in records:
+        # the table, sheet or file the stage worked on, the other tags go to Details
+        stage_object = record.get('table') or record.get('sheet') or record.get('file')
+        details = {key: value for key, value in record.items() if key not in known}
+        rows.append((record['run_id'], record['stage'], stage_object, record['status'], record['started_at'],
+                     record['wall_seconds'], record['cpu_seconds'], record['cpu_scope'], record['peak_rss_mb'],
+                     record['rss_delta_mb'], record['rows'], record['bytes'], record['error'],
+                     json.dumps(details, default=str, ensure_ascii=False)))
+    try:
+        query = f"""
+              INSERT INTO {table} (Run_Id,Stage,Stage_Object,Status,Started_At,Wall_Seconds,Cpu_Seconds,Cpu_Scope,Peak_RSS_MB,RSS_Delta_MB,Number_of_Rows,Number_of_Bytes,Error_Message,Details)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        """
+        cursor = connection.connection.cursor()
+        if hasattr(cursor, 'fast_executemany'):
+            cursor.fast_executemany = True
+        cursor.executemany(query, rows)
+    except Exception as e:
+        logging.exception("Error inserting to %s: %s", table, e)
+        raise
+
 # Logging configuration
 logging.basicConfig(level=logging.INFO)
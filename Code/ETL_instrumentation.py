@@ -0,0 +1,347 @@
+"""
+Per-stage timing and memory instrumentation of the SAMA ETL.
+
+A stage is any block of the pipeline (scrape, read, transform of a sheet, load of a table, audit) wrapped in
+`stage()` or decorated with `instrumented()`:
+
+    with ins.stage('load', table=table_name, rows=len(df)) as record:
+        ...
+    record['wall_seconds']
+
+Each finished stage gives one record with its wall time, CPU time, peak and growth of the resident set size and
+its row/byte counts. The record is logged as one JSON line on the 'sama.metrics' logger (see `log_to_file`),
+kept in memory for the run (`stage_records()`), and can be stored in ByDB with
+`ETL_com_functions.Insert_Stage_Metrics`.
+
+CPU time is the CPU time of the process for stages of the main thread and of the thread itself for stages run by
+a thread pool ('cpu_scope'), so concurrent table loads do not count each other's work.
+Peak RSS is the high-water mark of the process at the end of the stage: psutil is used when installed
+(Windows), the resource module otherwise; without both it is left empty.
+
+For a slow run `profiled()` profiles a whole entry point when the SAMA_PROFILE environment variable is set or
+--profile is given, see its docstring. When neither is set it only checks them and adds no overhead.
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import uuid
+import cProfile
+import logging
+import functools
+import threading
+from datetime import datetime
+from contextlib import contextmanager
+from collections import Counter
+
+import pandas as pd
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+METRICS_LOGGER = 'sama.metrics'
+# JSON-lines file of the stage records, appended by every run (see log_to_file)
+METRICS_FILE = 'etl_stage_metrics.jsonl'
+# Identifies the stages of one ETL run in the logs and the metrics table
+RUN_ID = f"{datetime.now():%Y%m%d%H%M%S}-{uuid.uuid4().hex[:8]}"
+
+# Profiling mode (see profiled): environment variable or command-line flag turning it on, directory of the
+# profiles next to the metrics file, and interval in seconds of the stack sampler
+PROFILE_ENV = 'SAMA_PROFILE'
+PROFILE_FLAG = '--profile'
+PROFILE_DIRECTORY = 'profiles'
+SAMPLE_INTERVAL = 0.005
+
+_records = []
+_records_lock = threading.Lock()
+# set while `collect` runs a worker call, its records are logged by the parent process instead
+_collecting = threading.local()
+logger = logging.getLogger(METRICS_LOGGER)
+
+
+def _rss_bytes():
+    """
+    Return (current RSS, peak RSS) of the process in bytes, None where the platform does not tell.
+    """
+    if psutil is not None:
+        memory = psutil.Process().memory_info()
+        # peak_wset on Windows; elsewhere psutil has no peak, the resource module below gives it
+        peak = getattr(memory, 'peak_wset', None)
+        if peak is None and resource is not None:
+            peak = _resource_peak()
+        return memory.rss, peak
+    if resource is not None:
+        return None, _resource_peak()
+    return None, None
+
+
+def _resource_peak():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _megabytes(value):
+    return None if value is None else round(value / 1024 / 1024, 1)
+
+
+def frame_size(obj):
+    """
+    Count the rows and in-memory bytes of a DataFrame, or of the DataFrames of a dict/list/tuple.
+
+    Returns:
+        tuple: (rows, bytes), (None, None) when `obj` holds no DataFrame.
+    """
+    if isinstance(obj, pd.DataFrame):
+        return len(obj), int(obj.memory_usage(index=True, deep=True).sum())
+    if isinstance(obj, dict):
+        obj = list(obj.values())
+    if isinstance(obj, (list, tuple)):
+        sizes = [frame_size(item) for item in obj]
+        sizes = [size for size in sizes if size[0] is not None]
+        if sizes:
+            return sum(size[0] for size in sizes), sum(size[1] for size in sizes)
+    return None, None
+
+
+def emit(record: dict):
+    """
+    Keep a finished stage record for the run and log it as one JSON line.
+    """
+    with _records_lock:
+        _records.append(record)
+    if not getattr(_collecting, 'active', False):
+        logger.info(json.dumps(record, default=str, ensure_ascii=False))
+
+
+def stage_records() -> list:
+    """
+    Return a copy of the records of the stages finished so far in this process.
+    """
+    with _records_lock:
+        return list(_records)
+
+
+def reset():
+    """
+    Forget the records of the stages finished so far.
+    """
+    with _records_lock:
+        _records.clear()
+
+
+@contextmanager
+def stage(name: str, **tags):
+    """
+    Measure a block of the pipeline as one stage.
+
+    The yielded record can be completed inside the block ('rows', 'bytes' or any other key); timings and memory
+    are filled in when the block ends, also when it raises (status 'failed' and the error message).
+
+    Args:
+        name (str): Stage name, e.g. 'read', 'transform', 'load'.
+        **tags: Context of the stage, e.g. sheet='30c', table='...', rows=100.
+
+    Yields:
+        dict: The record of the stage.
+    """
+    main_thread = threading.current_thread() is threading.main_thread()
+    cpu_clock = time.process_time if main_thread else time.thread_time
+    rss_start, _ = _rss_bytes()
+    record = {'run_id': RUN_ID, 'stage': name, 'rows': None, 'bytes': None, **tags,
+              'started_at': datetime.now().isoformat(timespec='seconds'), 'pid': os.getpid(),
+              'cpu_scope': 'process' if main_thread else 'thread', 'status': 'ok', 'error': None}
+    wall_start = time.perf_counter()
+    cpu_start = cpu_clock()
+    try:
+        yield record
+    except BaseException as error:
+        record['status'] = 'failed'
+        record['error'] = str(error) or type(error).__name__
+        raise
+    finally:
+        record['wall_seconds'] = round(time.perf_counter() - wall_start, 4)
+        record['cpu_seconds'] = round(cpu_clock() - cpu_start, 4)
+        rss_end, peak = _rss_bytes()
+        record['peak_rss_mb'] = _megabytes(peak)
+        record['rss_delta_mb'] = _megabytes(rss_end - rss_start) if rss_end is not None and rss_start is not None else None
+        emit(record)
+
+
+def instrumented(name: str = None, measure=frame_size, **tags):
+    """
+    Decorator measuring every call of a function as a stage (see `stage`).
+
+    Args:
+        name (str, optional): Stage name, the function name by default.
+        measure (callable, optional): Gives (rows, bytes) of the return value, by default counted when it
+                                      holds DataFrames (`frame_size`). None to skip.
+        **tags: Fixed tags of the stage.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            with stage(name or function.__name__, **tags) as record:
+                result = function(*args, **kwargs)
+                if measure is not None:
+                    record['rows'], record['bytes'] = measure(result)
+                return result
+        return wrapper
+    return decorator
+
+
+def collect(function, *args, **kwargs):
+    """
+    Call a function and return its result with the stage records it produced, for process-pool workers whose
+    records would otherwise stay in the worker process. The parent hands them to `add_records`, which logs them,
+    so they reach the handlers of the parent (`log_to_file`) whether the workers are forked or spawned.
+
+    Returns:
+        tuple: (result, list of records)
+    """
+    with _records_lock:
+        start = len(_records)
+    _collecting.active = True
+    try:
+        result = function(*args, **kwargs)
+    finally:
+        _collecting.active = False
+    with _records_lock:
+        produced = _records[start:]
+        del _records[start:]
+    return result, produced
+
+
+def add_records(records: list):
+    """
+    Keep and log the records of stages run in another process (see `collect`).
+    Their run id is set to the one of this process (spawned workers import this module again).
+    """
+    for record in records:
+        emit({**record, 'run_id': RUN_ID})
+
+
+def log_to_file(path: str):
+    """
+    Also write the stage records to `path` as bare JSON lines, one per stage, appended over the runs.
+    """
+    handler = logging.FileHandler(path, encoding='utf-8')
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    return handler
+
+
+def profiling_requested(argv=None) -> bool:
+    """
+    Tell whether the profiling mode is on: SAMA_PROFILE set to anything but '', '0', 'false' or 'no',
+    or --profile in the command-line arguments.
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    return PROFILE_FLAG in argv or os.environ.get(PROFILE_ENV, '').strip().lower() not in ('', '0', 'false', 'no')
+
+
+class StackSampler(threading.Thread):
+    """
+    Daemon thread sampling the Python stack of every other thread of the process every `interval` seconds,
+    counted as collapsed stacks ('thread;function (file:line);... count') for flamegraph.pl or speedscope.
+
+    Unlike cProfile it also sees the threads of the load pool, at the cost of missing calls shorter than the interval.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        super().__init__(name='sama-stack-sampler', daemon=True)
+        self.interval = interval
+        self.stacks = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == self.ident:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, f"thread-{thread_id}"))
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def write(self, path: str):
+        with open(path, 'w', encoding='utf-8') as file:
+            for stack, count in self.stacks.most_common():
+                file.write(f"{stack} {count}\n")
+
+
+class Profile:
+    """
+    Profile of one run given by `profiled`. Set `tag` (e.g. the bulletin file names) before the block ends
+    to have it in the file names; `paths` holds the written files afterwards.
+    """
+
+    def __init__(self, name: str, enabled: bool):
+        self.name = name
+        self.enabled = enabled
+        self.tag = None
+        self.paths = None
+
+
+@contextmanager
+def profiled(name: str, enabled: bool = None, directory: str = PROFILE_DIRECTORY, interval: float = SAMPLE_INTERVAL):
+    """
+    Profile a block with cProfile and the stack sampler when the profiling mode is on (see `profiling_requested`).
+
+    Two files are written in `directory`, named '<name>-<run id>-<tag>':
+    - .pstats: cProfile statistics of the calling thread (python -m pstats, snakeviz)
+    - .collapsed: sampled stacks of every thread, for flamegraph.pl or speedscope
+
+    Work done in process-pool workers is not seen, run the profiled entry point with one worker to include it.
+
+    Args:
+        name (str): Name of the profiled entry point, e.g. 'etl' or 'scrape'.
+        enabled (bool, optional): Force the mode on or off, by default `profiling_requested()`.
+        directory (str): Directory of the profile files, created if needed.
+        interval (float): Sampling interval in seconds.
+
+    Yields:
+        Profile: Its `enabled` is False and nothing is measured when the mode is off.
+    """
+    profile = Profile(name, profiling_requested() if enabled is None else enabled)
+    if not profile.enabled:
+        yield profile
+        return
+
+    sampler = StackSampler(interval)
+    profiler = cProfile.Profile()
+    sampler.start()
+    profiler.enable()
+    try:
+        yield profile
+    finally:
+        profiler.disable()
+        sampler.stop()
+        try:
+            os.makedirs(directory, exist_ok=True)
+            tag = re.sub(r'[^\w.+-]+', '_', profile.tag) if profile.tag else 'untagged'
+            base = os.path.join(directory, f"{name}-{RUN_ID}-{tag}")
+            profiler.dump_stats(base + '.pstats')
+            sampler.write(base + '.collapsed')
+            profile.paths = (base + '.pstats', base + '.collapsed')
+            logging.info(f"Profile of {name} written to {base}.pstats and {base}.collapsed")
+        except OSError as error:
+            logging.error(f"Could not write the profile of {name}: {error}")
@@ -0,0 +1,182 @@
+"""
+Content-addressed index of the SAMA Monthly Bulletin workbooks.
+
+Every downloaded workbook is identified by the SHA-256 of its bytes and recorded in 'archive_manifest.json'
+inside the Archive directory together with its URL, size and timestamps. The scraper uses it to skip files
+SAMA re-publishes unchanged, and the ETL uses it to archive a revised file that keeps the same name.
+"""
+
+import os
+import json
+import hashlib
+import logging
+import threading
+from datetime import datetime
+
+MANIFEST_FILE = 'archive_manifest.json'
+
+# Serialises read-modify-write cycles of the manifest when workbooks are downloaded concurrently
+_manifest_lock = threading.RLock()
+
+
+def file_sha256(file_path: str, chunk_size: int = 1024 * 1024) -> str:
+    """
+    Compute the SHA-256 of a file without loading it in memory.
+
+    Args:
+        file_path (str): Path of the file.
+        chunk_size (int): Number of bytes read per iteration.
+
+    Returns:
+        str: Hexadecimal SHA-256 digest.
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def atomic_write_json(path: str, data):
+    """
+    Write `data` as JSON to `path` through a temporary file renamed over it, so a crash never leaves a
+    half-written file behind. Used for the manifest, the HTTP cache and the run-state journal.
+    """
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(data, file, indent=2, ensure_ascii=False)
+    os.replace(temp_path, path)
+
+
+def load_manifest(archive_directory: str) -> dict:
+    """
+    Load the manifest of the archive directory.
+
+    Workbooks found in the archive but missing from the manifest (archived before the manifest existed)
+    are hashed and added, so the first run after an upgrade still recognises them.
+
+    Args:
+        archive_directory (str): The 'Archive' directory.
+
+    Returns:
+        dict: Mapping sha256 -> entry (file_name, url, size, downloaded_at, archived_as, archived_at).
+    """
+    manifest_path = os.path.join(archive_directory, MANIFEST_FILE)
+    try:
+        with _manifest_lock, open(manifest_path, 'r', encoding='utf-8') as file:
+            manifest = json.load(file)
+    except FileNotFoundError:
+        manifest = {}
+    except (ValueError, OSError) as error:
+        logging.warning(f"Rebuilding unreadable archive manifest {manifest_path}: {error}")
+        manifest = {}
+
+    if not os.path.isdir(archive_directory):
+        return manifest
+
+    indexed = {entry.get('archived_as') for entry in manifest.values()}
+    changed = False
+    for file_name in os.listdir(archive_directory):
+        file_path = os.path.join(archive_directory, file_name)
+        if not file_name.endswith('.xlsx') or file_name in indexed or not os.path.isfile(file_path):
+            continue
+        sha256 = file_sha256(file_path)
+        modified_at = datetime.fromtimestamp(os.path.getmtime(file_path)).isoformat(timespec='seconds')
+        manifest.setdefault(sha256, {
+            'file_name': file_name,
+            'url': None,
+            'size': os.path.getsize(file_path),
+            'downloaded_at': modified_at,
+            'archived_as': file_name,
+            'archived_at': modified_at,
+        })
+        changed = True
+
+    if changed:
+        with _manifest_lock:
+            save_manifest(archive_directory, manifest)
+    return manifest
+
+
+def save_manifest(archive_directory: str, manifest: dict):
+    """
+    Write the manifest to the archive directory, replacing the previous file atomically.
+
+    Args:
+        archive_directory (str): The 'Archive' directory.
+        manifest (dict): Mapping sha256 -> entry.
+    """
+    os.makedirs(archive_directory, exist_ok=True)
+    atomic_write_json(os.path.join(archive_directory, MANIFEST_FILE), manifest)
+
+
+def is_archived(manifest: dict, sha256: str) -> bool:
+    """
+    Return True if a workbook with this content was already processed and archived.
+    """
+    entry = manifest.get(sha256)
+    return bool(entry and entry.get('archived_as'))
+
+
+def record_download(archive_directory: str, file_path: str, url: str = None, sha256: str = None) -> dict:
+    """
+    Record a freshly downloaded workbook in the manifest (not archived yet).
+
+    Args:
+        archive_directory (str): The 'Archive' directory.
+        file_path (str): Path of the downloaded workbook.
+        url (str, optional): URL the workbook was downloaded from.
+        sha256 (str, optional): Precomputed digest of the file.
+
+    Returns:
+        dict: The manifest entry of the workbook.
+    """
+    sha256 = sha256 or file_sha256(file_path)
+    with _manifest_lock:
+        manifest = load_manifest(archive_directory)
+        entry = manifest.setdefault(sha256, {'archived_as': None, 'archived_at': None})
+        entry.update({
+            'file_name': os.path.basename(file_path),
+            'url': url or entry.get('url'),
+            'size': os.path.getsize(file_path),
+            'downloaded_at': datetime.now().isoformat(timespec='seconds'),
+        })
+        save_manifest(archive_directory, manifest)
+    return entry
+
+
+def archive_destination(archive_directory: str, file_name: str, sha256: str, manifest: dict) -> str:
+    """
+    Return the path a workbook is archived to.
+
+    A revised workbook published under the name of an already archived one gets the first 8 characters
+    of its hash appended ('Monthly_Bulletin_X_1a2b3c4d.xlsx') instead of overwriting the earlier version.
+    """
+    destination = os.path.join(archive_directory, file_name)
+    if os.path.exists(destination) and (manifest.get(sha256) or {}).get('archived_as') != file_name:
+        name, extension = os.path.splitext(file_name)
+        destination = os.path.join(archive_directory, f"{name}_{sha256[:8]}{extension}")
+    return destination
+
+
+def record_archived(archive_directory: str, sha256: str, archived_path: str, file_name: str = None):
+    """
+    Mark a workbook as processed and archived in the manifest.
+
+    Args:
+        archive_directory (str): The 'Archive' directory.
+        sha256 (str): Digest of the workbook.
+        archived_path (str): Path the workbook was moved to.
+        file_name (str, optional): Original file name, used when the download was never recorded.
+    """
+    with _manifest_lock:
+        manifest = load_manifest(archive_directory)
+        entry = manifest.setdefault(sha256, {
+            'file_name': file_name or os.path.basename(archived_path),
+            'url': None,
+            'downloaded_at': None,
+        })
+        entry['size'] = os.path.getsize(archived_path)
+        entry['archived_as'] = os.path.basename(archived_path)
+        entry['archived_at'] = datetime.now().isoformat(timespec='seconds')
+        save_manifest(archive_directory, manifest)
@@ -0,0 +1,146 @@
+"""
+Local columnar cache of parsed Monthly Bulletin sheets.
+
+After a workbook is parsed its DataFrames are stored as Parquet files under
+'<cache_directory>/<workbook sha256>-<code version>/<group>/', so rerunning the ETL after a failed load reads
+them back in milliseconds instead of reopening the xlsx. A new workbook or a change of the ETL code gives a new
+key. The least recently used entries are evicted once the cache grows over `max_bytes`.
+
+Parquet needs pyarrow; without it the cache is disabled and the ETL parses the workbooks as before.
+"""
+
+import os
+import json
+import shutil
+import logging
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    PARQUET_AVAILABLE = True
+except ImportError:
+    PARQUET_AVAILABLE = False
+
+CACHE_DIRECTORY = os.path.join(os.getcwd(), '.sama_cache')
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+INDEX_FILE = 'index.json'
+
+
+def _entry_directory(cache_directory: str, workbook_hash: str, code_version: str) -> str:
+    return os.path.join(cache_directory, f"{workbook_hash[:16]}-{code_version}")
+
+
+def _to_parquet_safe(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Store the non-null values of object columns as text, Parquet cannot hold columns mixing numbers,
+    datetimes and strings. The ETL casts these columns itself (str(), pd.to_numeric), so the text keeps its results.
+    """
+    df = df.copy()
+    for column in df.columns[df.dtypes == object]:
+        df[column] = df[column].where(df[column].isna(), df[column].astype(str))
+    return df
+
+
+def _from_parquet(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Turn the None Parquet gives back for missing values of object columns into NaN, like pd.read_excel.
+    """
+    for column in df.columns[df.dtypes == object]:
+        df[column] = df[column].where(df[column].notna(), np.nan)
+    return df
+
+
+def load_frames(cache_directory: str, workbook_hash: str, code_version: str, group: str):
+    """
+    Load a group of cached DataFrames.
+
+    Args:
+        cache_directory (str): Root directory of the cache.
+        workbook_hash (str): SHA-256 of the workbook.
+        code_version (str): Version of the code that produced the frames.
+        group (str): Name of the group, e.g. 'sheet-30c' or 'transformed-30c'.
+
+    Returns:
+        dict | None: Name -> DataFrame in the stored order, None on a cache miss.
+    """
+    if not PARQUET_AVAILABLE:
+        return None
+
+    entry_directory = _entry_directory(cache_directory, workbook_hash, code_version)
+    group_directory = os.path.join(entry_directory, group)
+    try:
+        with open(os.path.join(group_directory, INDEX_FILE), 'r', encoding='utf-8') as file:
+            names = json.load(file)
+        frames = {name: _from_parquet(pd.read_parquet(os.path.join(group_directory, f"{position}.parquet")))
+                  for position, name in enumerate(names)}
+    except FileNotFoundError:
+        return None
+    except Exception as error:
+        logging.warning(f"Ignoring unreadable cache entry {group_directory}: {error}")
+        return None
+
+    # mark the entry as recently used for the eviction
+    os.utime(entry_directory)
+    return frames
+
+
+def store_frames(cache_directory: str, workbook_hash: str, code_version: str, group: str, frames: dict,
+                 max_bytes: int = MAX_CACHE_BYTES):
+    """
+    Store a group of DataFrames and evict old entries if the cache is over `max_bytes`.
+
+    The index file is written last, so a group interrupted while being written is never read back.
+
+    Args:
+        cache_directory (str): Root directory of the cache.
+        workbook_hash (str): SHA-256 of the workbook.
+        code_version (str): Version of the code that produced the frames.
+        group (str): Name of the group.
+        frames (dict): Name -> DataFrame.
+        max_bytes (int): Maximum size of the cache directory.
+    """
+    if not PARQUET_AVAILABLE:
+        return
+
+    entry_directory = _entry_directory(cache_directory, workbook_hash, code_version)
+    group_directory = os.path.join(entry_directory, group)
+    try:
+        os.makedirs(group_directory, exist_ok=True)
+        for position, df in enumerate(frames.values()):
+            _to_parquet_safe(df).to_parquet(os.path.join(group_directory, f"{position}.parquet"))
+        temp_index = os.path.join(group_directory, INDEX_FILE + '.tmp')
+        with open(temp_index, 'w', encoding='utf-8') as file:
+            json.dump(list(frames), file, ensure_ascii=False)
+        os.replace(temp_index, os.path.join(group_directory, INDEX_FILE))
+    except Exception as error:
+        logging.warning(f"Could not cache {group} of workbook {workbook_hash[:12]}: {error}")
+        shutil.rmtree(group_directory, ignore_errors=True)
+        return
+
+    evict(cache_directory, max_bytes)
+
+
+def _directory_size(directory: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name))
+               for root, _, names in os.walk(directory) for name in names)
+
+
+def evict(cache_directory: str, max_bytes: int = MAX_CACHE_BYTES):
+    """
+    Delete the least recently used cache entries until the cache is not bigger than `max_bytes`.
+    """
+    if not os.path.isdir(cache_directory):
+        return
+
+    entries = [os.path.join(cache_directory, name) for name in os.listdir(cache_directory)]
+    entries = sorted((entry for entry in entries if os.path.isdir(entry)), key=os.path.getmtime)
+    sizes = {entry: _directory_size(entry) for entry in entries}
+    total = sum(sizes.values())
+    for entry in entries:
+        if total <= max_bytes:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= sizes[entry]
+        logging.info(f"Evicted cache entry {os.path.basename(entry)} ({sizes[entry] / 1024 / 1024:.1f} MB)")
@@ -3,16 +3,26 @@ from datetime import datetime
 import time
 import numpy as np
 import re
+import sys
+import argparse
 import logging
 import sqlalchemy
 from sqlalchemy.exc import SQLAlchemyError
 import os #to get the current working directory
 import shutil # to move file to another directory
 import glob #module to find all files matching the pattern
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from openpyxl import load_workbook
+from openpyxl.cell.cell import ERROR_CODES
 
 # Import custom modules
 import ETL_Config as c
 import ETL_com_functions as e
+import ETL_instrumentation as ins
+import SAMA_archive_manifest as am
+import SAMA_parsed_cache as pc
+import SAMA_run_state as rs
+import SAMA_sheet_schemas as ss
 
 """
 We configure logging using basicConfig() to set the logging level to INFO. 
@@ -21,7 +31,7 @@ This means that only messages with severity level INFO and higher will be logged
 logging.basicConfig(level=logging.INFO)
 
 # Initialize global variables for database connections and configurations
-Engine_DMDQ, Engine, SchemaName, database_name, num_src, start_time = None, None, None, None, None, None
+Engine_DMDQ, Engine, SchemaName, database_name, num_src = None, None, None, None, None
 
 def get_database_config(config_key):
     """Retrieve database configuration from ETL configuration module."""
@@ -47,95 +57,134 @@ def establish_connections(dest_config_key, dmdq_config_key):
         logging.error(f"Error establishing database connections: {error}")
         raise
 
-# Dictonary mapping to rename columns in '30c' sheet
-columns_30c = {
-    'Unnamed: 1': 'Period',
-    'Unnamed: 3': 'Sales_Total_Points_Of_Sale_Transactions',
-    'Unnamed: 4': 'Number_of_Transactions_Total_Points_Of_Sale_Transactions',
-    'Unnamed: 5': 'Number_of_Points_of_Sale_Terminals',
-    'Unnamed: 7': 'Number_of_Mobile_Transactions_Points_of_Sale_Transactions_Using_Near_Field_Communication_Technology',
-    'Unnamed: 8': 'Number_of_Cards_Transactions_Points_of_Sale_Transactions_Using_Near_Field_Communication_Technology',
-    'Unnamed: 10': 'Sales_Using_Mobile_Points_of_Sale_Transactions_Using_Near_Field_Communication_Technology',
-    'Unnamed: 11': 'Sales_Using_Cards_Points_of_Sale_Transactions_Using_Near_Field_Communication_Technology',
-    'Unnamed: 13': 'Sales_ECommerce_Transactions_Using_Mada_Cards',
-    'Unnamed: 14': 'Number_of_Transactions_Transactions_Using_Mada_Cards'
-}
+# Function to split at the decimal point and return the first part which is integer part
+def split_and_keep_integer(value):
+    if pd.isna(value):
+        return 0  # Handle NaN values by converting them to 0
+    return str(value).split('.')[0]  
 
-def rename_30d(row):
+def coerce_numeric_columns(df, number_columns=None, sales_columns=None, fill_missing=False):
     """
-    Generate column names based on the provided row of titles.
+    Cast all numeric columns of a DataFrame in one batch.
+
+    - Columns containing 'Number' in their name become Int64 holding the integer part of the value (NaN -> 0)
+    - Columns containing 'Sales' in their name become Float64 (NaN -> 0.0 with `fill_missing`)
+    (or the columns given, e.g. by the dtype plan of the sheet schema)
+
+    The whole block of columns is converted to float64 in one call (pd.to_numeric when some cells are not
+    numbers), then truncated and wrapped in nullable arrays, instead of `split_and_keep_integer` on every cell.
+    The result is the same as the row-wise version, except that a text which is not a number becomes <NA>
+    instead of failing the whole sheet.
 
     Args:
-    - row: A pandas Series representing a row of titles except the first column.
+    - df (pd.DataFrame): Frame with the raw cell values.
+    - number_columns (list, optional): Columns cast to Int64.
+    - sales_columns (list, optional): Columns cast to Float64.
+    - fill_missing (bool): Empty cells of the Sales columns become 0.0 instead of <NA>, like the '0.0' the
+      transform used to fill the sheets with.
 
     Returns:
-    - columns_30d: A list of column names generated based on the titles in the row.
-
-    for example:
-        if we have title like : 'Restaurants & Café' >>>> 'Number_of_Transactions_Restaurants_and_Café' and 'Sales_Restaurants_and_Café'
+    - df (pd.DataFrame): A new frame with the numeric columns cast, the other columns are copied as they are.
     """
-    titles = row.tolist()
-    titles = [x for x in titles if str(x) != 'nan']
-    
-    salesCount= 'Number_of_Transactions'
-    sales= 'Sales'
-    
-    columns_30d=['Period']
-    for main_title in titles:
-        main_title = main_title.strip()
-        main_title = main_title.replace('*', '')
-        main_title = main_title.replace("&", "and")
-        main_title = main_title.replace(' ', '_')
-        
-        columns_30d.append(salesCount + "_" + main_title)
-        columns_30d.append(sales + "_" + main_title)
-    
-    return columns_30d
-
-def rename_30e(row):
+    if number_columns is None:
+        number_columns = [col for col in df.columns if 'Number' in col]
+    if sales_columns is None:
+        sales_columns = [col for col in df.columns if 'Sales' in col]
+    columns = list(dict.fromkeys(list(number_columns) + list(sales_columns)))
+    if not columns or df.empty:
+        return df.astype({**{col: 'Int64' for col in number_columns}, **{col: 'Float64' for col in sales_columns}})
+
+    block = df[columns].to_numpy(dtype=object)
+    try:
+        # fast path: every cell is a number, a numeric string or NaN
+        values = block.astype('float64')
+        missing = np.isnan(values)
+        invalid = np.zeros_like(missing)
+    except (TypeError, ValueError):
+        values = pd.to_numeric(block.ravel(), errors='coerce').astype('float64').reshape(block.shape)
+        missing = np.isnan(values)
+        invalid = missing & ~pd.isna(block)
+
+    # the cast arrays go straight into the new frame, the object columns they replace are never copied
+    cast = {}
+    for position, col in enumerate(columns):
+        if col in sales_columns:
+            if fill_missing:
+                floats = np.where(missing[:, position] & ~invalid[:, position], 0.0, values[:, position])
+                cast[col] = pd.arrays.FloatingArray(floats, invalid[:, position].copy())
+            else:
+                cast[col] = pd.arrays.FloatingArray(values[:, position].copy(), missing[:, position].copy())
+        else:
+            # NaN -> 0 like split_and_keep_integer, a text which is not a number becomes <NA>
+            integers = np.trunc(np.where(missing[:, position], 0, values[:, position])).astype('int64')
+            cast[col] = pd.arrays.IntegerArray(integers, invalid[:, position].copy())
+    return pd.DataFrame({col: cast[col] if col in cast else df[col] for col in df.columns},
+                        index=df.index)
+
+# One pattern for every kind of period, e.g. 'Q1 2019', '2019 ', '2019-01-31 00:00:00 '
+PERIOD_PATTERN = re.compile(r'^(?:(?P<Qurternum>Q[1-4])\s+\D*(?P<Yearnum>\d{4})'
+                            r'|(?P<date>\d{4}(?P<month>-\d{2}-\d{2}(?= 00:00:00))?))')
+
+# Categories of the Qurternum column of the quarter tables
+QUARTERS = ['Q1', 'Q2', 'Q3', 'Q4']
+
+def classify_periods(period):
     """
-    Generate column names based on the provided row of titles.
+    Label every row of a sheet by the kind of its period, with one vectorized pass of PERIOD_PATTERN.
+
+    The sheets list the yearly rows first, then the quarterly rows, then the monthly rows:
+    - 'quarter': 'Q1 2019', Yearnum and Qurternum are extracted
+    - 'year': a period starting with a year, before the first 'Q1' row
+    - 'month': a 'YYYY-MM-DD 00:00:00' date after the last 'Q1' row
+    - 'junk': titles, blank rows and notes
 
     Args:
-    - row: A pandas Series representing a row of titles except the first column
+    - period (pd.Series): The 'Period' column.
 
     Returns:
-    - columns_30e: A list of column names generated based on the titles in the row.
+    - periods (pd.DataFrame): Columns 'kind', 'Yearnum', 'Qurternum' and 'date' ('2019' or '2019-01-31')
+      with the index of `period`.
+    """
+    parts = period.astype(str).str.extract(PERIOD_PATTERN)
+    is_quarter = parts['Qurternum'].notna().to_numpy()
+
+    q1_positions = np.flatnonzero(parts['Qurternum'].eq('Q1').to_numpy())
+    if not len(q1_positions):
+        raise ValueError("no 'Q1' period found")
+    positions = np.arange(len(parts))
+    is_year = parts['date'].notna().to_numpy() & (positions < q1_positions[0])
+    is_month = parts['month'].notna().to_numpy() & (positions > q1_positions[-1])
+
+    parts['kind'] = np.select([is_quarter, is_year, is_month], ['quarter', 'year', 'month'], 'junk')
+    return parts[['kind', 'Yearnum', 'Qurternum', 'date']]
 
-    for example: 
-        if we have title like : 'Riyadh ' >>>> 'Number_of_Transactions_Riyadh' , 'Sales_Riyadh' and 'Number_of_Terminals_Riyadh'
+def newer_than_watermark(periods, kind, watermark=None):
     """
-    titles = row.tolist()
-   
-    titles = [x for x in titles if str(x) != 'nan']
-    
-    salesCount= 'Number_of_Transactions'
-    sales= 'Sales'
-    devices = 'Number_of_Terminals'
-    
-    columns_30e=['Period']
-    for main_title in titles:
-        main_title = main_title.strip()
-
-        main_title = main_title.replace('-', '')
-        columns_30e.append(salesCount + "_" + main_title)
-        columns_30e.append(sales + "_" + main_title)
-        columns_30e.append(devices + "_" + main_title)
-        
-    # Remove specific items from the list
-    columns_30e = [column_name for column_name in columns_30e if str(column_name) != 'Number_of_Terminals_الفترة']
-        
-    return columns_30e
+    Return the mask of the rows of one kind newer than the watermark of their destination table.
 
-# Function to split at the decimal point and return the first part which is integer part
-def split_and_keep_integer(value):
-    if pd.isna(value):
-        return 0  # Handle NaN values by converting them to 0
-    return str(value).split('.')[0]  
+    Args:
+    - periods (pd.DataFrame): Result of `classify_periods`.
+    - kind (str): 'year', 'quarter' or 'month'.
+    - watermark: MAX(Period) of a year or month table, (Yearnum, Qurternum) of a quarter table,
+      None to keep every row (empty table or full-history mode).
+
+    Returns:
+    - mask (pd.Series): True for the rows to transform and load.
+    """
+    is_kind = periods['kind'] == kind
+    if watermark is None:
+        return is_kind
+    if kind == 'quarter':
+        year, quarter = int(watermark[0]), str(watermark[1]).strip()
+        yearnum = pd.to_numeric(periods['Yearnum'])
+        return is_kind & ((yearnum > year) | ((yearnum == year) & (periods['Qurternum'] > quarter)))
+    # a year table holds '2019 ' or '2019-12-31 00:00:00 ', compare the year only
+    width = 4 if kind == 'year' else 10
+    return is_kind & (periods['date'].str[:width] > str(watermark)[:width])
 
 def mapping_sheet_name(original_sheet_name):
     """
-    Map the original sheet name to a part of a table name based on predefined mappings.
+    Map the original sheet name to a part of a table name, the table prefix of its schema in SAMA_sheet_schemas.
 
     Args:
     - original_sheet_name (str): The original sheet name to be mapped.
@@ -144,17 +193,10 @@ def mapping_sheet_name(original_sheet_name):
     - part_table_name (str): Part of the table name based on the mapped value from `original_sheet_name`.
 
     Raises:
-    - KeyError: If `original_sheet_name` is not found as sheet name in excel file.
+    - KeyError: If `original_sheet_name` is not a registered sheet.
 
     """
-    # Specify the list of table names for each DataFrame
-    table_mappings = {
-        '30c': 'SAMA_POINTS_OF_SALE_AND_TRANSACTIONS_by',
-        '30d': 'SAMA_Points_of_Sale_Transactions_by_Sectors_by',
-        '30e': 'SAMA_Points_of_Sale_Transactions_by_Main_Cities_by',
-    }
-    
-    part_table_name = table_mappings[original_sheet_name]
+    part_table_name = ss.get_schema(original_sheet_name)['table_prefix']
 
     return part_table_name
 
@@ -162,6 +204,9 @@ def move_file_to_archive(file_path):
     """
     Move files with names matching 'Monthly_Bulletin_*xlsx' to the 'Archive' directory.
 
+    Each file is recorded by its SHA-256 in the archive manifest. A revised file keeping the name of an
+    already archived one is stored next to it with a hash suffix instead of failing the move.
+
     Parameters:
     file_path (str): The pattern file name we need to look for inside current working dir.
 
@@ -185,9 +230,14 @@ def move_file_to_archive(file_path):
             logging.info("No files matching the pattern were found.")
             return
         
+        manifest = am.load_manifest(archive_directory)
         for file_path in files:
-            shutil.move(file_path, archive_directory)
-            logging.info(f"File moved to: {archive_directory}")
+            sha256 = am.file_sha256(file_path)
+            destination = am.archive_destination(archive_directory, os.path.basename(file_path), sha256, manifest)
+            shutil.move(file_path, destination)
+            am.record_archived(archive_directory, sha256, destination, file_name=os.path.basename(file_path))
+            manifest = am.load_manifest(archive_directory)
+            logging.info(f"File moved to: {destination}")
 
     except FileNotFoundError as e:
         logging.error(f"File not found: {file_path}. Exception: {e}")
@@ -196,42 +246,302 @@ def move_file_to_archive(file_path):
     except Exception as e:
         logging.error(f"An error occurred while moving the file: {file_path}. Exception: {e}")
 
-def read_excel_sheets(pattern):
+# Sheets of the Monthly Bulletin loaded by the ETL, described in SAMA_sheet_schemas
+SHEET_NAMES = list(ss.SHEET_SCHEMAS)
+# Title of the period column, the data of every sheet starts at the row holding it
+PERIOD_MARKER = ss.PERIOD_MARKER
+# Zero-based header row passed to pd.read_excel (Excel row 13)
+HEADER_ROW = 12
+# Version of this ETL code and of the sheet schemas, part of the parsed-sheet cache key so a code change never reuses stale frames
+CODE_VERSION = am.file_sha256(os.path.abspath(__file__))[:6] + am.file_sha256(os.path.abspath(ss.__file__))[:6]
+# Cell texts pd.read_excel reads as NaN
+NA_STRINGS = {'', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN',
+              '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a', 'nan', 'null'}
+
+def _excel_cell_value(value):
+    """
+    Convert a cell value read by openpyxl the same way pd.read_excel does:
+    whole floats become int, empty cells, error cells and NA strings become NaN.
+    """
+    if value is None:
+        return np.nan
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str) and (value in NA_STRINGS or value in ERROR_CODES):
+        return np.nan
+    return value
+
+def _trim_empty_cells(row):
+    """
+    Drop the empty cells at the end of a row, as pd.read_excel does.
+    """
+    end = len(row)
+    while end and row[end - 1] in (None, ''):
+        end -= 1
+    return row[:end]
+
+def read_sheet_streaming(workbook, sheet_name, marker=PERIOD_MARKER, header_row=HEADER_ROW):
+    """
+    Read one sheet of a read-only openpyxl workbook starting at the row where `marker` is found.
+
+    Rows are streamed with iter_rows(values_only=True); rows above the marker are skipped without being kept
+    and the columns are named like pd.read_excel(header=header_row) names them ('Unnamed: 1', ...),
+    so `transform_data` handles both readers the same way. Like pd.read_excel, the <dimension> stored in the
+    sheet is ignored (exported workbooks often have a wrong one, read-only mode would cut the sheet to it) and
+    trailing empty cells and rows are dropped.
+
+    Args:
+    - workbook: openpyxl workbook opened with read_only=True.
+    - sheet_name (str): Name of the sheet.
+    - marker (str): Text of the period column title in the second column.
+    - header_row (int): Zero-based row whose values name the columns.
+
+    Returns:
+    - df (pd.DataFrame): Rows of the sheet from the marker row to the end.
+
+    Raises:
+    - ValueError: If the marker is not found in the sheet.
+    """
+    worksheet = workbook[sheet_name]
+    worksheet.reset_dimensions()
+    header = ()
+    rows = []
+    for row_number, row in enumerate(worksheet.iter_rows(min_row=header_row + 1, values_only=True)):
+        row = _trim_empty_cells(row)
+        if row_number == 0:
+            header = row
+        elif rows or (len(row) > 1 and row[1] == marker):
+            rows.append([_excel_cell_value(value) for value in row])
+
+    if not rows:
+        raise ValueError(f"'{marker}' not found in sheet {sheet_name}")
+    while not rows[-1]:
+        rows.pop()
+
+    width = max(len(header), max(len(row) for row in rows))
+    columns = [f"Unnamed: {i}" if i >= len(header) or header[i] is None else str(header[i]) for i in range(width)]
+    rows = [row + [np.nan] * (width - len(row)) for row in rows]
+    return pd.DataFrame(rows, columns=columns)
+
+def read_workbook_streaming(file, sheet_names=SHEET_NAMES):
+    """
+    Open a workbook in openpyxl read-only mode and stream only the requested sheets.
+
+    Returns:
+    - excel_data (dict): sheet name -> DataFrame, like pd.read_excel(sheet_name=[...]).
+    """
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        return {sheet_name: read_sheet_streaming(workbook, sheet_name, marker=ss.get_schema(sheet_name)['marker'])
+                for sheet_name in sheet_names}
+    finally:
+        workbook.close()
+
+def read_sheets(file, sheet_names=SHEET_NAMES, streaming=True, engine=None, use_cache=True, workbook_hash=None):
+    """
+    Read sheets of an Excel file, from the parsed-sheet cache when this workbook was parsed before.
+
+    Sheets missing from the cache are read in one pass over the workbook and stored in the cache
+    (Parquet, keyed by the workbook SHA-256 and CODE_VERSION).
+
+    Args:
+    - file (str): Path to the Excel file.
+    - sheet_names (list): Sheets to read.
+    - streaming (bool): Stream the sheets with openpyxl read-only mode instead of pd.read_excel.
+    - engine (str, optional): pd.read_excel engine when not streaming.
+    - use_cache (bool): Read from and write to the parsed-sheet cache.
+    - workbook_hash (str, optional): Precomputed SHA-256 of the file.
+
+    Returns:
+    - excel_data (dict): sheet name -> DataFrame, like pd.read_excel(sheet_name=[...]).
+    """
+    excel_data = {}
+    if use_cache:
+        workbook_hash = workbook_hash or am.file_sha256(file)
+        for sheet_name in sheet_names:
+            cached = pc.load_frames(pc.CACHE_DIRECTORY, workbook_hash, CODE_VERSION, f"sheet-{sheet_name}")
+            if cached is not None:
+                logging.info(f"Read {sheet_name} of {file} from the parsed-sheet cache")
+                excel_data[sheet_name] = cached[sheet_name]
+
+    missing_sheets = [sheet_name for sheet_name in sheet_names if sheet_name not in excel_data]
+    if missing_sheets:
+        if streaming:
+            parsed = read_workbook_streaming(file, missing_sheets)
+        else:
+            parsed = pd.read_excel(file, sheet_name=missing_sheets, header=HEADER_ROW, engine=engine) #like in V1(monshaat)
+        for sheet_name in missing_sheets:
+            if use_cache:
+                pc.store_frames(pc.CACHE_DIRECTORY, workbook_hash, CODE_VERSION, f"sheet-{sheet_name}",
+                                {sheet_name: parsed[sheet_name]})
+            excel_data[sheet_name] = parsed[sheet_name]
+
+    return {sheet_name: excel_data[sheet_name] for sheet_name in sheet_names}
+
+def bulletin_dates(file, sheet_name=SHEET_NAMES[0]):
+    """
+    Return the dates of a bulletin itself: the latest month in the period column of `sheet_name` and the time
+    SAMA last saved the workbook (its document properties). Either is None when it cannot be read.
+    """
+    latest_month, saved_at = None, None
+    try:
+        workbook = load_workbook(file, read_only=True, data_only=True)
+        try:
+            saved_at = workbook.properties.modified
+            worksheet = workbook[sheet_name]
+            worksheet.reset_dimensions()
+            # the months are date cells, the years and quarters numbers and text
+            months = [value for (value,) in worksheet.iter_rows(min_col=2, max_col=2, values_only=True) if isinstance(value, datetime)]
+            latest_month = max(months, default=None)
+        finally:
+            workbook.close()
+    except Exception as error:
+        logging.warning(f"Could not read the dates of {file}: {error}")
+    return latest_month, saved_at
+
+def list_bulletin_files(pattern):
+    """
+    Return the files matching the pattern, oldest bulletin first, so the newest bulletin wins when they are merged.
 
+    Bulletins are ordered by their latest month, then by the time SAMA saved them (a revised bulletin of the
+    same month), then by modification time and name. The modification time alone is not reliable: concurrent
+    backfill downloads finish in any order and copies reset it. Reading those dates opens every workbook, so a
+    single waiting file (the usual monthly run) is returned without opening it.
     """
-    Read sheets: 30c, 30d, 30e in an Excel file and return them as a list of tuples.
+    def order(file):
+        latest_month, saved_at = bulletin_dates(file)
+        return (latest_month or datetime.min, saved_at or datetime.min, os.path.getmtime(file), file)
+
+    files = glob.glob(pattern)
+    return sorted(files, key=order) if len(files) > 1 else files
+
+def table_key_columns(table_name):
+    """
+    Return the columns identifying a row of a destination table: Yearnum & Qurternum for quarterly tables, Period otherwise.
+    """
+    return ['Yearnum', 'Qurternum'] if 'Quarter' in table_name else ['Period']
+
+def destination_tables(sheet_names=SHEET_NAMES):
+    """
+    Return the names of the Year, Quarter and Month tables the sheets are loaded into.
+    """
+    return [f"{mapping_sheet_name(sheet_name)}_{period}" for sheet_name in sheet_names for period in ('Year', 'Quarter', 'Month')]
+
+def read_table_watermarks(dest_engine, schema_name, table_names):
+    """
+    Read the last loaded period of every destination table, used by the incremental mode of `transform_data`.
+
+    Args:
+    - dest_engine: Engine of the destination database.
+    - schema_name (str): Schema of the destination tables.
+    - table_names (list): Destination tables, see `destination_tables`.
+
+    Returns:
+    - watermarks (dict): Table name -> MAX(Period) for Year and Month tables, (Yearnum, MAX(Qurternum) of that year)
+      for Quarter tables. Empty tables and tables whose watermark could not be read are left out,
+      so their whole history is loaded.
+    """
+    watermarks = {}
+    for table_name in table_names:
+        if table_key_columns(table_name) == ['Period']:
+            query = f"SELECT MAX(Period) FROM {schema_name}.{table_name}"
+        else:
+            query = f"""
+            SELECT MAX(Yearnum), MAX(Qurternum)
+            FROM {schema_name}.{table_name}
+            WHERE Yearnum = (SELECT MAX(Yearnum) FROM {schema_name}.{table_name})
+            """
+        try:
+            with dest_engine.connect() as connection:
+                row = connection.execute(query).first()
+        except Exception as e:
+            logging.warning(f"Could not read the watermark of {table_name}, its whole history will be loaded: {e}")
+            continue
+
+        if row is None or row[0] is None:
+            continue
+        watermarks[table_name] = row[0] if len(row) == 1 else tuple(row)
+        logging.info(f"Watermark of {table_name}: {watermarks[table_name]}")
+    return watermarks
+
+# SAMA revises the figures of recent periods: with --update the incremental mode also re-reads and updates
+# the periods of the last REVISION_MONTHS months before the watermarks (and the quarters and years they cover)
+REVISION_MONTHS = 12
+
+def rewind_watermarks(watermarks, months=REVISION_MONTHS):
+    """
+    Move every watermark back by `months`, so the periods SAMA may have revised are transformed again.
+
+    Args:
+    - watermarks (dict): Result of `read_table_watermarks`.
+    - months (int): Length of the revision window.
+
+    Returns:
+    - watermarks (dict): Month tables go back `months` months, quarter tables months // 3 quarters and
+      year tables months // 12 years (at least one).
+    """
+    rewound = {}
+    for table_name, watermark in watermarks.items():
+        if table_name.endswith('_Quarter'):
+            position = int(watermark[0]) * 4 + int(str(watermark[1]).strip()[1]) - 1 - max(1, months // 3)
+            rewound[table_name] = (position // 4, f"Q{position % 4 + 1}")
+        elif table_name.endswith('_Year'):
+            rewound[table_name] = str(int(str(watermark)[:4]) - max(1, months // 12))
+        else:
+            rewound[table_name] = (pd.Timestamp(str(watermark)[:10]) - pd.DateOffset(months=months)).strftime('%Y-%m-%d')
+        logging.info(f"Watermark of {table_name} rewound to {rewound[table_name]} to update revised periods")
+    return rewound
+
+def merge_table_frames(older_df, newer_df, table_name):
+    """
+    Merge the same table coming from two bulletins, keeping the newer row when a period exists in both.
+    """
+    merged = pd.concat([older_df, newer_df])
+    return merged.drop_duplicates(subset=table_key_columns(table_name), keep='last')
+
+def read_excel_sheets(pattern, streaming=True, engine=None, use_cache=True):
+
+    """
+    Read sheets: 30c, 30d, 30e in every Excel file matching the pattern and return them as a list of tuples.
+
+    The files are read oldest first (see `list_bulletin_files`), so when `transform_data` merges the
+    same table of several bulletins the newest values win.
 
     Parameters:
-        file_path (str): Path to the Excel file.
+        pattern (str): Pattern of the Excel file names.
+        streaming (bool): Stream the three sheets with openpyxl read-only mode starting at the 'الفترة' row,
+                          instead of loading the whole workbook with pd.read_excel.
+        engine (str, optional): pd.read_excel engine when not streaming, e.g. 'calamine' (pandas >= 2.2).
+        use_cache (bool): Reuse the sheets cached by an earlier run on the same workbook (see `read_sheets`).
 
     Returns:
         list of tubles: A tuple where first elements are sheet names and second values are corresponding DataFrames.
     """
-    global start_time
     try:
-        start_time = time.time()
         # Find all files matching the pattern
-        files = glob.glob(pattern)
+        files = list_bulletin_files(pattern)
         if not files:
             print("No files matching the pattern were found.")
             return []
-        # Read all sheets into a dictionary of DataFrames
+        # Read all sheets of every file into a list of (sheet_name, DataFrame)
+        sheets_data = []
         for file in files:
             try:
-                excel_data = pd.read_excel(file, sheet_name=['30c', '30d', '30e'], header=12) #like in V1(monshaat)
-                logging.info("Started reading data")
+                logging.info(f"Started reading data from {file}")
+                excel_data = read_sheets(file, SHEET_NAMES, streaming=streaming, engine=engine, use_cache=use_cache)
 
             except FileNotFoundError:
-                logging.error(f"File '{file_path}' not found.")
+                logging.error(f"File '{file}' not found.")
                 return None
+
+            # Convert dictionary to a list of tuples
+            sheets_data.extend((sheet_name, excel_data[sheet_name]) for sheet_name in excel_data)
     
     except Exception as e:
         logging.error(f"An error occurred while reading Excel file: {str(e)}")
         return None
     
     try:
-        # Convert dictionary to a list of tuples
-        sheets_data = [(sheet_name, excel_data[sheet_name]) for sheet_name in excel_data]
         
         logging.info("Function of Reading all sheets reading finished")
         return sheets_data
@@ -239,12 +549,28 @@ def read_excel_sheets(pattern):
     except Exception as e:
         logging.error(f"An error occurred while processing Excel sheets: {str(e)}")
 
-def transform_data(sheets_data):
+def memory_report(frames):
+    """
+    Log the rows, columns and in-memory size of every table.
+
+    Returns:
+    - report (dict): Table name -> {'rows': int, 'columns': int, 'bytes': int}.
+    """
+    report = {}
+    for table_name, df in frames.items():
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        report[table_name] = {'rows': len(df), 'columns': df.shape[1], 'bytes': size}
+        logging.info(f"{table_name}: {len(df)} rows x {df.shape[1]} columns, {size / 1024:.1f} KB in memory")
+    return report
+
+def transform_data(sheets_data, watermarks=None):
     """
     Transform raw data from Excel sheets into formatted DataFrames for different time periods.
 
     Args:
     - sheets_data (list): A list of tuples where each tuple contains a sheet name and its corresponding DataFrame.
+    - watermarks (dict, optional): Table name -> last loaded period (see `read_table_watermarks`). Only the rows
+      newer than the watermark of their table are cast and returned (incremental mode); None returns the whole history.
 
     Returns:
     - transformed_data (dict): A dictionary where keys are table names and values are DataFrames with transformed data.
@@ -255,23 +581,27 @@ def transform_data(sheets_data):
       2. Drops columns with all NaN values.
       3. Combines data from two columns into one.
       4. Delete unneeded column
-      5. Renames columns based on the sheet name.
+      5. Renames columns with the naming rule of the sheet schema (SAMA_sheet_schemas).
       6. Drops columns containing '_الفترة' in the name.
-      7. Adds 'STG_CreatedDate' column with the current datetime.
-      8. Splits 'Period' column into 'Yearnum' and 'Qurternum' columns for quarterly data.
-      9. Filters rows based on specific patterns for yearly, quarterly, and monthly data.
+      7. Filters rows based on specific patterns for yearly, quarterly, and monthly data,
+         and on the watermarks in incremental mode.
+      8. Casts the numeric columns of the kept rows once, straight to Int64/Float64 (empty cells -> 0).
+      9. Splits 'Period' column into 'Yearnum' (int16) and 'Qurternum' (categorical) columns for quarterly data.
       10. Stores each transformed DataFrame into a dictionary with the corresponding table name.
+      'STG_CreatedDate' is not part of the frames, it is added when the tables are loaded (see `add_load_columns`).
 
     """
     transformed_data = {}  # Dictionary to store transformed data
+    watermarks = watermarks or {}
 
     for sheet_name, df in sheets_data:
         # Map sheet_name to part of table name
         part_table_name = mapping_sheet_name(sheet_name)
         try:
             logging.info(f"Transforming SAMA data: {sheet_name}...")
-            # Find the index where 'الفترة' is found and start processing from there
-            start_index = df.index[df['Unnamed: 1'] == 'الفترة'][0]
+            schema = ss.get_schema(sheet_name)
+            # Find the index where the period marker ('الفترة') is found and start processing from there
+            start_index = df.index[df['Unnamed: 1'] == schema['marker']][0]
             df = df.iloc[start_index:]
             
             # Drop columns with all NaN values
@@ -282,104 +612,67 @@ def transform_data(sheets_data):
             df['Unnamed: 1'] = df['Unnamed: 1'].str.replace("nan", "")
             del df["Unnamed: 2"]
 
-            # Extract first row and all columns except the first one
-            subset_data = df.iloc[0, 1:]  
+            # Titles of the first row except the first column
+            titles = tuple(str(title) for title in df.iloc[0, 1:] if str(title) != 'nan')
 
-            # Rename columns based on sheet_name
-            if sheet_name == '30c':
-                df.rename(columns=columns_30c, inplace=True)
-                df.replace('---', np.nan, inplace=True)
-            elif sheet_name == '30d':
-                renamed_30d_columns = rename_30d(subset_data)
-                df.columns = renamed_30d_columns
-            elif sheet_name == '30e':
-                renamed_30e_columns = rename_30e(subset_data)
-                df.columns = renamed_30e_columns
+            # Rename columns with the naming rule of the sheet schema
+            df.columns = ss.column_names(sheet_name, tuple(df.columns), titles)
+            if schema['na_values']:
+                df.replace(list(schema['na_values']), np.nan, inplace=True)
 
             # Drop columns containing '_الفترة' in its name
-            columns_to_drop = [col for col in df.columns if '_الفترة' in col]
+            columns_to_drop = [col for col in df.columns if f"_{schema['marker']}" in col]
             df.drop(columns=columns_to_drop, inplace=True)
         
-            # Add 'STG_CreatedDate' column with the current datetime
-            df['STG_CreatedDate'] = datetime.now()
-            # replace nan values with '0'
-            df.replace(np.nan, '0.0', inplace=True)
+            # Columns cast to Int64 and Float64
+            number_columns, sales_columns = ss.dtype_plan(sheet_name, tuple(df.columns))
 
-         
-            # Identify the start and last index  where 'Period' column contains 'Q'
-            first_Q_index = df[df['Period'].str.contains('Q1')].index.tolist()[0]
-            last_Q_index = df[df['Period'].str.contains('Q1')].index.tolist()[-1]
-
-            # Define patterns to match datetime formats
-            year_pattern = r'^\d{4}|^\d{4}-12-31 00:00:00'
-            month_pattern = r'^\d{4}-\d{2}-\d{2} 00:00:00'
+            # Define table names
+            table_name_year = part_table_name + '_Year'
+            table_name_quarter = part_table_name + '_Quarter'
+            table_name_month = part_table_name + '_Month'
 
-            # year_df Filter rows based start dataframe to the first index has 'Q' & on  year_pattern format patterns
-            year_df = df.loc[:first_Q_index - 1]
-            year_df = year_df[year_df['Period'].astype(str).str.match(year_pattern)]
+            # Label every row as a year, quarter, month or junk row in one pass over 'Period',
+            # keeping only the periods newer than the watermark of their table in incremental mode
+            periods = classify_periods(df['Period'])
+            is_year = newer_than_watermark(periods, 'year', watermarks.get(table_name_year))
+            is_quarter = newer_than_watermark(periods, 'quarter', watermarks.get(table_name_quarter))
+            is_month = newer_than_watermark(periods, 'month', watermarks.get(table_name_month))
 
             """
             - If columns contain 'Number' in its name will be integer
             - If columns contain 'Sales' in its name will be float
+            - Empty cells become 0, a text which is not a number becomes <NA>
+            Only the rows kept for the three kinds are cast, together once; the year, quarter and month frames are taken from the result.
             """
-            year_number_columns = [col for col in year_df.columns if 'Number' in col]
-            for col in year_number_columns:
-                year_df[col] = year_df[col].apply(split_and_keep_integer).astype('Int64')
+            kept_rows = is_year | is_quarter | is_month
+            df = coerce_numeric_columns(df[kept_rows], number_columns, sales_columns, fill_missing=True)
+            periods, is_year, is_quarter, is_month = (mask[kept_rows] for mask in (periods, is_year, is_quarter, is_month))
+
+            year_df = df[is_year]
 
-            year_sales_columns = [col for col in year_df.columns if 'Sales' in col]
-            for col in year_sales_columns:
-                year_df[col] = pd.to_numeric(year_df[col], errors='coerce').astype('Float64')
-            
             """
                             quarter_df:
             - Filter the rows which have 'Q'
-            - Split 'Period' column to 2 columns : Yearnum & Qurternum
-            - Insert Yearnum as first column , insert Qurternum as second column
-            - Remove from 'Yearnum' values '.0'
-            - Drop 'Period'
+            - Replace 'Period' with 2 columns : Yearnum & Qurternum
+            - Yearnum holds the year only so '2000.0' -> 2000, as int16; Qurternum is a categorical of 'Q1'..'Q4'
 
             """
+            period_position = df.columns.get_loc('Period')
+            quarter_df = df[is_quarter].drop(columns='Period')
+            quarter_df.insert(period_position, 'Qurternum', pd.Categorical(periods.loc[is_quarter, 'Qurternum'], categories=QUARTERS))
+            quarter_df.insert(period_position, 'Yearnum', periods.loc[is_quarter, 'Yearnum'].astype(np.int16))
 
-            quarter_df = df[df['Period'].str.contains('Q')]
-            quarter_df.insert(quarter_df.columns.get_loc('Period') + 1, 'Qurternum',
-                            df['Period'].str.split(pat=' ', expand=True)[0], allow_duplicates=False)
-            quarter_df.insert(quarter_df.columns.get_loc('Period'), 'Yearnum',
-                            df['Period'].str.split(pat=' ', expand=True)[1], allow_duplicates=False)
-          
-            # and the 'Year' column is of object type so '2000.0' -> '2000'
-            quarter_df['Yearnum'] = quarter_df['Yearnum'].str.extract('(\d{4})', expand=False).astype(int)
-            quarter_df.drop('Period', axis=1, inplace=True)
-
-            quarter_number_columns = [col for col in quarter_df.columns if 'Number' in col]
-            for col in quarter_number_columns:
-                quarter_df[col] = quarter_df[col].apply(split_and_keep_integer).astype('Int64')
-
-            quarter_sales_columns = [col for col in quarter_df.columns if 'Sales' in col]
-            for col in year_sales_columns:
-                quarter_df[col] = pd.to_numeric(quarter_df[col], errors='coerce').astype('Float64')
-
-            # month_df Filter rows based start dataframe after the last index has 'Q' to the end of dataframe & on  month_pattern format patterns
-            month_df = df.loc[last_Q_index + 1:]
-            month_df = month_df[month_df['Period'].astype(str).str.match(month_pattern)]
-            
-            month_number_columns = [col for col in month_df.columns if 'Number' in col]
-            for col in month_number_columns:
-                month_df[col] = month_df[col].apply(split_and_keep_integer).astype('Int64')
-
-            month_sales_columns = [col for col in month_df.columns if 'Sales' in col]
-            for col in month_sales_columns:
-                month_df[col] = pd.to_numeric(month_df[col], errors='coerce').astype('Float64')
-
-            # Define table names
-            table_name_year = part_table_name + '_Year'
-            table_name_quarter = part_table_name + '_Quarter'
-            table_name_month = part_table_name + '_Month'
+            month_df = df[is_month]
 
-            # Store transformed DataFrames in the dictionary
-            transformed_data[table_name_year] = year_df
-            transformed_data[table_name_quarter] = quarter_df
-            transformed_data[table_name_month] = month_df
+            # Store transformed DataFrames in the dictionary, merged with the same table of an older bulletin
+            for table_name, table_df in ((table_name_year, year_df), (table_name_quarter, quarter_df), (table_name_month, month_df)):
+                if table_name in transformed_data:
+                    table_df = merge_table_frames(transformed_data[table_name], table_df, table_name)
+                transformed_data[table_name] = table_df
 
+            memory_report({table_name: transformed_data[table_name]
+                           for table_name in (table_name_year, table_name_quarter, table_name_month)})
             logging.info(f"Finished to transform SAMA data: {part_table_name}")
         
         except Exception as e:
@@ -388,77 +681,266 @@ def transform_data(sheets_data):
 
     return transformed_data
 
-def load_transformed_dataframes(transformed_dataframes, dest_engine, schema_name):
+def read_and_transform_sheet(file, sheet_name, streaming=True, use_cache=True, workbook_hash=None, cache_transformed=False,
+                             watermarks=None):
+    """
+    Read one sheet of an Excel file and transform it, used as a process-pool worker.
+
+    Args:
+    - file (str): Path to the Excel file.
+    - sheet_name (str): Sheet to read, e.g. '30c'.
+    - streaming (bool): Stream the sheet with openpyxl read-only mode instead of pd.read_excel.
+    - use_cache (bool): Reuse the parsed sheet cached by an earlier run on the same workbook.
+    - workbook_hash (str, optional): Precomputed SHA-256 of the file.
+    - cache_transformed (bool): Also cache the transformed tables, so a rerun skips the transform too.
+      Only the full history is cached, not the rows kept by the watermarks.
+    - watermarks (dict, optional): Table name -> last loaded period, see `transform_data`.
+
+    Returns:
+    - transformed_data (dict): Table name -> transformed DataFrame for the sheet (empty if its transform failed).
+    """
+    if use_cache:
+        workbook_hash = workbook_hash or am.file_sha256(file)
+    cache_transformed = cache_transformed and not watermarks
+    file_name = os.path.basename(file)
+    if use_cache and cache_transformed:
+        with ins.stage('read', file=file_name, sheet=sheet_name, source='transformed cache') as record:
+            cached = pc.load_frames(pc.CACHE_DIRECTORY, workbook_hash, CODE_VERSION, f"transformed-{sheet_name}")
+            record['rows'], record['bytes'] = ins.frame_size(cached)
+        if cached is not None:
+            logging.info(f"Read transformed {sheet_name} of {file} from the parsed-sheet cache")
+            return cached
+
+    with ins.stage('read', file=file_name, sheet=sheet_name) as record:
+        excel_data = read_sheets(file, [sheet_name], streaming=streaming, use_cache=use_cache, workbook_hash=workbook_hash)
+        record['rows'], record['bytes'] = ins.frame_size(excel_data[sheet_name])
+    with ins.stage('transform', file=file_name, sheet=sheet_name) as record:
+        transformed_data = transform_data([(sheet_name, excel_data[sheet_name])], watermarks)
+        record['rows'], record['bytes'] = ins.frame_size(transformed_data)
+
+    if use_cache and cache_transformed and transformed_data:
+        pc.store_frames(pc.CACHE_DIRECTORY, workbook_hash, CODE_VERSION, f"transformed-{sheet_name}", transformed_data)
+    return transformed_data
+
+def process_bulletin_files(files, max_workers=1, streaming=True, sheet_names=SHEET_NAMES, use_cache=True, cache_transformed=False,
+                           watermarks=None):
+    """
+    Read and transform every sheet of every bulletin file and merge them into one set of tables.
+
+    With `max_workers` > 1 all (file, sheet) pairs run in a ProcessPoolExecutor, otherwise one after another.
+    Results are merged oldest file first, so a period present in several bulletins keeps the newest values.
+    A sheet failing to read or transform is logged and skipped, like in `transform_data`.
+
+    Parameters:
+        files (list): Excel files, oldest first (see `list_bulletin_files`).
+        max_workers (int): Number of worker processes, 1 to process in this process.
+        streaming (bool): Stream the sheets with openpyxl read-only mode instead of pd.read_excel.
+        sheet_names (list): Sheets to process.
+        use_cache (bool): Reuse the sheets parsed by an earlier run on the same workbook.
+        cache_transformed (bool): Also cache and reuse the transformed tables.
+        watermarks (dict, optional): Table name -> last loaded period; only newer periods are transformed
+                                     (incremental mode). None transforms the whole history (backfills).
+
+    Returns:
+        transformed_data (dict): Table name -> merged transformed DataFrame, as returned by `transform_data`.
+        file_results (dict): File -> {'status': 'ok' | 'failed', 'tables': int, 'rows': int, 'errors': {sheet: message}}.
+    """
+    transformed_data = {}
+    file_results = {}
+    if not files:
+        logging.info("No files matching the pattern were found.")
+        return transformed_data, file_results
+
+    executor = ProcessPoolExecutor(max_workers=max_workers) if max_workers > 1 else None
+    try:
+        pending = []
+        for file in files:
+            # hash every workbook once here instead of once per sheet in the workers
+            workbook_hash = am.file_sha256(file) if use_cache else None
+            for sheet_name in sheet_names:
+                arguments = (file, sheet_name, streaming, use_cache, workbook_hash, cache_transformed, watermarks)
+                if executor:
+                    # the stage records of the worker come back with its result
+                    pending.append((file, sheet_name, arguments, executor.submit(ins.collect, read_and_transform_sheet, *arguments)))
+                else:
+                    pending.append((file, sheet_name, arguments, None))
+
+        for file, sheet_name, arguments, future in pending:
+            result = file_results.setdefault(file, {'status': 'ok', 'tables': 0, 'rows': 0, 'errors': {}})
+            try:
+                if future:
+                    sheet_tables, records = future.result()
+                    ins.add_records(records)
+                else:
+                    sheet_tables = read_and_transform_sheet(*arguments)
+                if not sheet_tables:
+                    raise ValueError("transform failed, see the log above")
+            except Exception as e:
+                logging.error(f"An error occurred while processing {sheet_name} in {file}: {str(e)}")
+                result['status'] = 'failed'
+                result['errors'][sheet_name] = str(e)
+                continue #if sheet has a problem continue with another sheet
+
+            for table_name, table_df in sheet_tables.items():
+                result['tables'] += 1
+                result['rows'] += len(table_df)
+                if table_name in transformed_data:
+                    table_df = merge_table_frames(transformed_data[table_name], table_df, table_name)
+                transformed_data[table_name] = table_df
+    finally:
+        if executor:
+            executor.shutdown()
+
+    for file, result in file_results.items():
+        logging.info(f"{file}: {result['status']}, {result['tables']} tables, {result['rows']} rows"
+                     + (f", errors: {result['errors']}" if result['errors'] else ""))
+    return transformed_data, file_results
+
+def insert_new_rows_with_temp_table(df, table_name, dest_engine, schema_name, chunk_size=e.BULK_CHUNK_SIZE):
+    """
+    Previous load path: bulk load the frame into 'temp_<table>', insert its rows whose key is not in the
+    destination table yet with INSERT ... WHERE NOT EXISTS, then drop the temporary table.
+    """
+    # Create a temporary table to hold the new data
+    temp_table_name = f"temp_{table_name}"
+    e.bulk_load_dataframe(df, temp_table_name, dest_engine, schema=schema_name, if_exists='replace', chunk_size=chunk_size)
+
+    with dest_engine.connect() as connection:
+        if 'Quarter' in table_name:
+            # Insert new records where the combination of 'Yearnum' and 'Qurternum' does not exist
+            insert_query = f"""
+            INSERT INTO {schema_name}.{table_name} ({', '.join(df.columns)})
+            SELECT {', '.join(df.columns)}
+            FROM {schema_name}.{temp_table_name} AS temp
+            WHERE NOT EXISTS (
+                SELECT 1
+                FROM {schema_name}.{table_name} AS main
+                WHERE main.Yearnum = temp.Yearnum
+                AND main.Qurternum = temp.Qurternum
+            )
+            """
+        else:
+             # Insert new records where 'Period' does not exist
+            insert_query = f"""
+            INSERT INTO {schema_name}.{table_name} ({', '.join(df.columns)})
+            SELECT {', '.join(df.columns)}
+            FROM {schema_name}.{temp_table_name} AS temp
+            WHERE NOT EXISTS (
+                SELECT 1
+                FROM {schema_name}.{table_name} AS main
+                WHERE main.Period = temp.Period
+            )
+            """
+        connection.execute(insert_query)
+
+    # Drop the temporary table
+    with dest_engine.connect() as connection:
+        connection.execute(f"DROP TABLE IF EXISTS {schema_name}.{temp_table_name}")
+
+# Columns added to every table when it is loaded, not kept in the transformed frames
+LOAD_COLUMNS = ('STG_CreatedDate',)
+
+def add_load_columns(df, created_at):
+    """
+    Return the frame as it is loaded: the transformed columns and 'STG_CreatedDate' holding `created_at`.
+    """
+    return df.assign(STG_CreatedDate=pd.Timestamp(created_at))
+
+def load_table(table_name, df, dest_engine, schema_name, chunk_size=e.BULK_CHUNK_SIZE, upsert=True, update_existing=False,
+               created_at=None):
+    """
+    Load one transformed table, see `load_transformed_dataframes`.
+    'STG_CreatedDate' is set to `created_at` (now by default) on every row, only for the time of the load.
+
+    Returns:
+        seconds (float): Time spent loading the table.
+    """
+    logging.info(f"Loading transformed data to {table_name}...")
+
+    rows, size = ins.frame_size(df)
+    df = add_load_columns(df, created_at or datetime.now())
+    with ins.stage('load', table=table_name, rows=rows, bytes=size, upsert=upsert) as record:
+        if upsert:
+            e.upsert_dataframe(df, table_name, dest_engine, table_key_columns(table_name), schema=schema_name,
+                               update_existing=update_existing, chunk_size=chunk_size)
+        else:
+            insert_new_rows_with_temp_table(df, table_name, dest_engine, schema_name, chunk_size)
+
+    seconds = record['wall_seconds']
+    logging.info(f"Successfully loaded transformed data to {table_name} in {seconds:.2f} seconds")
+    return seconds
+
+def load_transformed_dataframes(transformed_dataframes, dest_engine, schema_name, chunk_size=e.BULK_CHUNK_SIZE,
+                                upsert=True, update_existing=False, max_workers=1, on_table_done=None):
     """
     Load the transformed dataframes into DB tables.
 
+    By default each table is upserted in one transaction (see `ETL_com_functions.upsert_dataframe`): the rows are
+    staged in a session-scoped table and merged on the table key (Period, or Yearnum & Qurternum), so a failure
+    leaves neither half-loaded data nor a temporary table behind.
+
+    The tables are independent, with `max_workers` > 1 they are loaded by a thread pool sharing the pooled engine
+    (its pool must allow `max_workers` connections), so the load takes about as long as the slowest table.
+    A table failing to load is logged and recorded, the other tables are still loaded.
+    'STG_CreatedDate' is added to the rows while they are loaded, with one timestamp for the whole run.
+
     Parameters:
         transformed_dataframes (dict): A dictionary where keys are sheet names and values are corresponding transformed DataFrames.
         dest_engine : engine created on destination table
         schema_name : scheam name where destination table located in
+        chunk_size (int): Number of rows sent per batch.
+        upsert (bool): Upsert in one transaction; False uses the previous 'temp_<table>' path (`insert_new_rows_with_temp_table`).
+        update_existing (bool): Also update the rows of periods already loaded with the values of the bulletin
+                                (SAMA revises recent figures), instead of only inserting new periods.
+        max_workers (int): Number of tables loaded at the same time, 1 loads them one after another.
+        on_table_done (callable, optional): Called in this thread with (table name, result) as soon as each table is
+                                            loaded, skipped or failed, e.g. to record it in the run-state journal.
 
     Returns:
-        total_execution_time (float): totla time in seconds from start reading data until loading to DB table
+        total_execution_time (str): Wall-clock seconds of the whole load, formatted with 2 decimals.
+        table_results (dict): Table name -> {'status': 'ok' | 'failed' | 'skipped', 'rows': int, 'seconds': float, 'error': str}.
     """
-    execution_times = []
-    
-    for table_name, df in transformed_dataframes.items():
-        try:
-            logging.info(f"Loading transformed data to {table_name}...")
-            
-            # Start the timer
-            start_time = time.time()
-            
-            # Create a temporary table to hold the new data
-            temp_table_name = f"temp_{table_name}"
-            df.to_sql(temp_table_name, con=dest_engine, schema=schema_name, if_exists='replace', index=False)
-            
-            with dest_engine.connect() as connection:
-                if 'Quarter' in table_name:
-                    # Insert new records where the combination of 'Yearnum' and 'Qurternum' does not exist
-                    insert_query = f"""
-                    INSERT INTO {schema_name}.{table_name} ({', '.join(df.columns)})
-                    SELECT {', '.join(df.columns)}
-                    FROM {schema_name}.{temp_table_name} AS temp
-                    WHERE NOT EXISTS (
-                        SELECT 1
-                        FROM {schema_name}.{table_name} AS main
-                        WHERE main.Yearnum = temp.Yearnum
-                        AND main.Qurternum = temp.Qurternum
-                    )
-                    """
-                else:
-                     # Insert new records where 'Period' does not exist
-                    insert_query = f"""
-                    INSERT INTO {schema_name}.{table_name} ({', '.join(df.columns)})
-                    SELECT {', '.join(df.columns)}
-                    FROM {schema_name}.{temp_table_name} AS temp
-                    WHERE NOT EXISTS (
-                        SELECT 1
-                        FROM {schema_name}.{table_name} AS main
-                        WHERE main.Period = temp.Period
-                    )
-                    """
-                connection.execute(insert_query)
-            
-            # Drop the temporary table
-            with dest_engine.connect() as connection:
-                connection.execute(f"DROP TABLE IF EXISTS {schema_name}.{temp_table_name}")
-            
-            # Calculate load time
-            load_time = time.time() - start_time
-            execution_times.append(load_time)
-            logging.info(f"Successfully loaded transformed data to {table_name}")
-            
-        except Exception as e:
-            logging.error(f"Error loading DataFrame into {table_name}: {e}")
-
-    total_execution_time = sum(execution_times)
-    logging.info(f"Successfully loaded Transformed data into {schema_name} database in {total_execution_time:.2f} seconds.")
-
-    return format(total_execution_time, ".2f")
+    table_results = {}
+    wall_start = time.perf_counter()
 
-def log_data_load(engine_dmdq, db_name, schema_name, table_names, src_table, execution_time, data_frames):
+    pending = {}
+    for table_name, df in transformed_dataframes.items():
+        if df.empty:
+            logging.info(f"No new rows to load to {table_name}")
+            table_results[table_name] = {'status': 'skipped', 'rows': 0, 'seconds': 0.0, 'error': None}
+            if on_table_done:
+                on_table_done(table_name, table_results[table_name])
+        else:
+            pending[table_name] = df
+
+    # one STG_CreatedDate for every row loaded by the run
+    arguments = (dest_engine, schema_name, chunk_size, upsert, update_existing, datetime.now())
+    executor = ThreadPoolExecutor(max_workers=max_workers) if max_workers > 1 and len(pending) > 1 else None
+    try:
+        futures = {table_name: executor.submit(load_table, table_name, df, *arguments)
+                   for table_name, df in pending.items()} if executor else {}
+        for table_name, df in pending.items():
+            try:
+                seconds = futures[table_name].result() if executor else load_table(table_name, df, *arguments)
+                table_results[table_name] = {'status': 'ok', 'rows': len(df), 'seconds': seconds, 'error': None}
+            except Exception as error:
+                logging.error(f"Error loading DataFrame into {table_name}: {error}")
+                table_results[table_name] = {'status': 'failed', 'rows': 0, 'seconds': 0.0, 'error': str(error)}
+            if on_table_done:
+                on_table_done(table_name, table_results[table_name])
+    finally:
+        if executor:
+            executor.shutdown()
+
+    total_execution_time = time.perf_counter() - wall_start
+    failed = [table_name for table_name, result in table_results.items() if result['status'] == 'failed']
+    logging.info(f"Loaded Transformed data into {schema_name} database in {total_execution_time:.2f} seconds "
+                 f"(sum of the table times {sum(result['seconds'] for result in table_results.values()):.2f} seconds)"
+                 + (f", failed tables: {failed}" if failed else ""))
+
+    return format(total_execution_time, ".2f"), table_results
+
+def log_data_load(engine_dmdq, db_name, schema_name, table_names, src_table, execution_time, data_frames=None, table_sizes=None):
     """
     Log data loading details to a database table for monitoring and auditing purposes.
     
@@ -468,27 +950,89 @@ def log_data_load(engine_dmdq, db_name, schema_name, table_names, src_table, exe
     - schema_name: The name of the schema where the logging table resides.
     - table_names: A list of table names for which data loading is being logged.
     - src_table: The name of the source table (or file) for logging purposes.
-    - execution_time: The total execution time for the data load process.
+    - execution_time: Load time of each table (dict of table name -> seconds, e.g. from the table results of
+      `load_transformed_dataframes`), or one value logged for every table.
     - data_frames: The list of DataFrames that were loaded into the database.
+    - table_sizes: Instead of the DataFrames, table name -> (columns, rows) as loaded, e.g. kept in the run-state
+      journal for tables loaded by an earlier run.
     
     Raises:
     - Exception: If there is an error during the logging of data load details.
     """
     try:
-        for table_name, data_frame in zip(table_names, data_frames):
-            rows, cols = data_frame.shape
-            count = e.Generate_Frequency_of_load(engine_dmdq, table_name)
-            #dest_count_df = e.read_database_count(db_name, schema_name, table_name, con=Engine)
-            #count_of_dest = int(dest_count_df.iloc[0, 0])
-            src_type = "EXCEL"
-            #rejected_rows = 0
-            #num_src = sum([df.shape[0] for df in data_frames])
-            rejected_rows = 0          # num_src - count_of_dest
-            e.Insert_TO_DMDQ(engine_dmdq, db_name, schema_name, table_name, execution_time, cols, rows, count, datetime.now(), src_table, src_type, rejected_rows)
-            logging.info(f"Data load logged successfully for {table_name}.")
+        src_type = "EXCEL"
+        #rejected_rows = 0
+        #num_src = sum([df.shape[0] for df in data_frames])
+        rejected_rows = 0          # num_src - count_of_dest
+        logged_at = datetime.now()
+
+        if not isinstance(execution_time, dict):
+            execution_time = dict.fromkeys(table_names, execution_time)
+        if table_sizes is None:
+            # the loaded tables also have the LOAD_COLUMNS
+            table_sizes = {table_name: (len(data_frame.columns.union(LOAD_COLUMNS)), data_frame.shape[0])
+                           for table_name, data_frame in zip(table_names, data_frames)}
+
+        # one transaction: a single MERGE updates every load counter, a single executemany inserts every audit row
+        with ins.stage('audit', rows=len(table_names)), e.transaction_scope(engine_dmdq) as connection:
+            counts = e.Generate_Frequency_of_loads(connection, table_names)
+            records = [(db_name, schema_name, table_name, execution_time[table_name], *table_sizes[table_name],
+                        counts[table_name], logged_at, src_table, src_type, rejected_rows)
+                       for table_name in table_names]
+            e.Insert_TO_DMDQ_batch(connection, records)
+        logging.info(f"Data load logged successfully for {len(records)} tables.")
     except Exception as error:
         logging.error(f"Error logging data load: {error}")
         raise
+
+# Default numbers of worker processes transforming the sheets and of tables loaded at the same time, overridden by
+# TRANSFORM_WORKERS / LOAD_WORKERS in ETL_Config and by --transform-workers N / --load-workers N.
+# 1 processes them one after another, parallelism is opt-in.
+TRANSFORM_WORKERS = 1
+LOAD_WORKERS = 1
+
+def positive_int(value):
+    """
+    argparse type of the worker counts.
+
+    Raises:
+    - argparse.ArgumentTypeError: If the value is not a positive integer.
+    """
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        number = 0
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be a positive integer, not {value!r}")
+    return number
+
+def parse_arguments(argv=None):
+    """
+    Parse the command line of the ETL; a mistyped flag ends the run with a usage error instead of being ignored.
+    The worker counts ('--load-workers 4' or '--load-workers=4') are else set in ETL_Config, else
+    TRANSFORM_WORKERS / LOAD_WORKERS.
+
+    Returns:
+    argparse.Namespace: full, update, metrics_table, profile, transform_workers and load_workers.
+    """
+    parser = argparse.ArgumentParser(description="Transform the SAMA bulletins waiting in the working directory and load them.",
+                                     allow_abbrev=False)
+    parser.add_argument('--full', action='store_true',
+                        help="transform and load the whole history instead of the periods newer than the loaded ones")
+    parser.add_argument('--update', action='store_true',
+                        help=f"also overwrite the loaded periods with the revised values (the last {REVISION_MONTHS} months, "
+                             "the whole history with --full)")
+    parser.add_argument('--metrics-table', action='store_true', help="also store the stage metrics of the run in ByDB")
+    # read by ins.profiling_requested, declared here so the parser accepts it
+    parser.add_argument(ins.PROFILE_FLAG, dest='profile', action='store_true',
+                        help=f"write a cProfile and a sampled-stack profile of the run (or {ins.PROFILE_ENV}=1)")
+    # string defaults go through `type` too, so a wrong value in ETL_Config is reported like a wrong flag
+    parser.add_argument('--transform-workers', type=positive_int, default=str(getattr(c, 'TRANSFORM_WORKERS', TRANSFORM_WORKERS)),
+                        help="worker processes reading and transforming the sheets")
+    parser.add_argument('--load-workers', type=positive_int, default=str(getattr(c, 'LOAD_WORKERS', LOAD_WORKERS)),
+                        help="tables loaded at the same time (the engine pool must allow as many connections)")
+    return parser.parse_args(argv)
+
 def check_for_xlsx_files():
     """
     Check if there are any files ending with .xlsx in the current working directory.
@@ -504,34 +1048,173 @@ def check_for_xlsx_files():
             return True
     return False
 
+def resume_plan(entries, sheet_names=SHEET_NAMES):
+    """
+    Find the work left for the bulletin files from their entries in the run-state journal.
+
+    Parameters:
+        entries (list): Journal entries of the files (see `SAMA_run_state.start_workbook`).
+        sheet_names (list): Sheets processed by the ETL.
+
+    Returns:
+        tables_to_load (list): Destination tables not loaded yet for at least one file.
+        sheets_to_transform (list): Sheets those tables are built from.
+    """
+    tables_to_load = [table_name for table_name in destination_tables(sheet_names)
+                      if any(rs.pending_tables(entry, [table_name]) for entry in entries)]
+    sheets_to_transform = [sheet_name for sheet_name in sheet_names
+                           if set(destination_tables([sheet_name])) & set(tables_to_load)]
+    return tables_to_load, sheets_to_transform
+
+def table_sources(table_names, hashes, file_results):
+    """
+    Return table name -> sha256 of the files merged into the table, i.e. whose sheet of the table did not fail.
+
+    Parameters:
+        table_names (list): Destination tables.
+        hashes (dict): File -> sha256.
+        file_results (dict): File results of `process_bulletin_files`.
+    """
+    sheet_of_table = {table_name: sheet_name for sheet_name in SHEET_NAMES for table_name in destination_tables([sheet_name])}
+    return {table_name: [sha256 for file, sha256 in hashes.items()
+                         if file in file_results and sheet_of_table[table_name] not in file_results[file]['errors']]
+            for table_name in table_names}
+
+def audit_loaded_tables(engine_dmdq, db_name, schema_name, hashes, table_names, state_path=rs.RUN_STATE_FILE):
+    """
+    Log to DM_Quality the tables loaded but not audited yet for some of the files, by this run or by an earlier
+    run whose audit failed, with the columns, rows and load time kept in the run-state journal.
+
+    Parameters:
+        hashes (dict): File -> sha256 of the bulletin files of the run.
+        table_names (list): Destination tables.
+
+    Returns:
+        list: The audited tables.
+    """
+    state = rs.load_state(state_path)
+    entries = {sha256: state.get(sha256, {}) for sha256 in hashes.values()}
+    audit_sources = {}
+    for table_name in table_names:
+        sources = [sha256 for sha256, entry in entries.items()
+                   if not rs.pending_tables(entry, [table_name]) and rs.pending_tables(entry, [table_name], 'audited')]
+        if sources:
+            audit_sources[table_name] = sources
+    if not audit_sources:
+        return []
+
+    # the latest load of each table
+    loads = {table_name: max((entries[sha256]['tables'][table_name] for sha256 in sources), key=lambda load: load['loaded_at'])
+             for table_name, sources in audit_sources.items()}
+    log_data_load(engine_dmdq, db_name, schema_name, list(loads), 'SAMA',
+                  {table_name: load.get('seconds', '0.00') for table_name, load in loads.items()},
+                  table_sizes={table_name: (load.get('columns'), load.get('rows', 0)) for table_name, load in loads.items()})
+    for table_name, sources in audit_sources.items():
+        rs.mark_tables(sources, [table_name], 'audited', state_path)
+    return list(loads)
+
 def main():
 
     logging.info("Starting ETL process...")
     dest_config_key = 'ByFileDB_Extrenal_Prod'
     dmdq_config_key = 'ByDB_General_Prod' 
     file_path = "Monthly_Bulletin_*.xlsx"
+    arguments = parse_arguments()
+    # Number of processes reading and transforming the sheets of all files, 1 processes them one after another
+    transform_workers = arguments.transform_workers
+    # Only transform and load the periods newer than the last loaded ones; run with --full to reload the whole history
+    incremental = not arguments.full
+    # Also overwrite the periods already loaded with the revised values of the bulletin: the last REVISION_MONTHS
+    # in incremental mode (see rewind_watermarks), the whole history with --full
+    update_existing = arguments.update
+    # Number of tables loaded at the same time, 1 loads them one after another (the engine pool must allow as many connections)
+    load_workers = arguments.load_workers
+    # Also store the stage metrics of the run in ByDB (see e.Insert_Stage_Metrics, the table must exist)
+    metrics_table = arguments.metrics_table
+    # The stage metrics are logged and appended as JSON lines to this file, to compare runs as the bulletin grows
+    ins.log_to_file(ins.METRICS_FILE)
 
     #if there is xlsx file in current working dir, start ETL process
     if check_for_xlsx_files(): 
-        try:
-            # Assuming establish_connections is correctly defined elsewhere
-            Engine_DMDQ, Engine, SchemaName, database_name = establish_connections(dest_config_key, dmdq_config_key) 
-
-            #read sheets in excel file and return list of tuples(sheet_name, dataframe)
-        
-            sheets_data = read_excel_sheets(file_path)
-            # return dictionary, key=sheet_name & value= transformed dataframe
-            transform_dfs = transform_data(sheets_data)
-            # Load data to the database
-            execution_time = load_transformed_dataframes(transform_dfs, Engine, SchemaName)
-            # Log the data load operation
-            log_data_load(Engine_DMDQ, database_name, SchemaName, list(transform_dfs.keys()), 'SAMA', execution_time, list(transform_dfs.values()))        
-            logging.info(f"ETL process completed successfully in {execution_time} seconds.")
+        # files and tables that failed, the run then ends with exit status 1 so the SSIS job fails too
+        failures = []
+        # SAMA_PROFILE=1 or --profile writes a cProfile and a sampled-stack profile of the run (see ins.profiled)
+        with ins.profiled('etl') as profile:
+            if profile.enabled:
+                # the profilers only see this process, so the sheets are transformed here
+                transform_workers = 1
+            try:
+                # Assuming establish_connections is correctly defined elsewhere
+                Engine_DMDQ, Engine, SchemaName, database_name = establish_connections(dest_config_key, dmdq_config_key) 
+
+                with ins.stage('etl', incremental=incremental) as run_record:
+                    # read and transform the sheets of every bulletin waiting in the working directory (several pile up after an outage),
+                    # return dictionary, key=table_name & value= transformed dataframe merged over the files, and the result of each file
+                    files = list_bulletin_files(file_path)
+                    profile.tag = '+'.join(os.path.splitext(os.path.basename(file))[0] for file in files)
+                    # the run-state journal keeps, per workbook, the tables already loaded and audited by an interrupted run;
+                    # only the sheets of the tables still missing are transformed and loaded again
+                    hashes = {file: am.file_sha256(file) for file in files}
+                    entries = [rs.start_workbook(hashes[file], os.path.basename(file)) for file in files]
+                    all_tables = destination_tables()
+                    tables_to_load, sheets_to_transform = resume_plan(entries)
+                    if len(tables_to_load) < len(all_tables):
+                        logging.info(f"Resuming an earlier run, tables left to load: {tables_to_load}")
+
+                    transform_dfs, file_results = {}, {}
+                    if sheets_to_transform:
+                        with ins.stage('watermarks'):
+                            watermarks = read_table_watermarks(Engine, SchemaName, tables_to_load) if incremental else None
+                            if watermarks and update_existing:
+                                watermarks = rewind_watermarks(watermarks)
+                        transform_dfs, file_results = process_bulletin_files(files, max_workers=transform_workers, sheet_names=sheets_to_transform,
+                                                                             watermarks=watermarks)
+                        transform_dfs = {table_name: df for table_name, df in transform_dfs.items() if table_name in tables_to_load}
+                    sources = table_sources(list(transform_dfs), hashes, file_results)
+
+                    # record each table in the journal as soon as it is loaded, so a later failure does not lose it
+                    def table_done(table_name, result):
+                        if result['status'] != 'failed':
+                            rs.mark_tables(sources[table_name], [table_name], 'loaded', details={table_name: {
+                                'rows': result['rows'], 'columns': len(transform_dfs[table_name].columns.union(LOAD_COLUMNS)),
+                                'seconds': format(result['seconds'], ".2f")}})
+
+                    # Load data to the database
+                    execution_time, table_results = load_transformed_dataframes(transform_dfs, Engine, SchemaName, update_existing=update_existing,
+                                                                                max_workers=load_workers, on_table_done=table_done)
+                    # Log the data load operation of the loaded tables, with the load time of each table
+                    audit_loaded_tables(Engine_DMDQ, database_name, SchemaName, hashes, all_tables)
+                    run_record['rows'], run_record['bytes'] = ins.frame_size(transform_dfs)
+                    failures = [f"{file}: {result['errors']}" for file, result in file_results.items() if result['status'] == 'failed']
+                    failures += [f"{table_name}: {result['error']}" for table_name, result in table_results.items() if result['status'] == 'failed']
+                    if failures:
+                        run_record['status'], run_record['error'] = 'failed', '; '.join(failures)
+                if failures:
+                    logging.error(f"ETL process finished with failures in {run_record['wall_seconds']:.2f} seconds "
+                                  f"(load {execution_time} seconds): {run_record['error']}")
+                else:
+                    logging.info(f"ETL process completed successfully in {run_record['wall_seconds']:.2f} seconds "
+                                 f"(load {execution_time} seconds).")
+                if metrics_table:
+                    with e.transaction_scope(Engine_DMDQ) as connection:
+                        e.Insert_Stage_Metrics(connection, ins.stage_records())
         
-            #move file to 'Archive' after finished processing
-            move_file_to_archive(file_path)
-        except Exception as error:
-            logging.error(f"An error occurred in the ETL process: {error}")
+                #move files to 'Archive' once every table is loaded and audited, the others stay for the next run
+                state = rs.load_state()
+                for file, sha256 in hashes.items():
+                    if rs.is_complete(state.get(sha256, {}), all_tables):
+                        move_file_to_archive(os.path.basename(file))
+                        # move_file_to_archive logs its errors, the file is still here when it failed
+                        if not os.path.exists(file):
+                            rs.mark_stage(sha256, 'archive')
+                    else:
+                        logging.warning(f"{file} was not fully processed and stays in the working directory")
+            except Exception as error:
+                # the traceback is the only trace the SSIS job leaves of the failure
+                logging.exception("An error occurred in the ETL process")
+                failures.append(str(error))
+        if failures:
+            sys.exit(1)
     else:
         logging.info("There is no new files to be processed")
 
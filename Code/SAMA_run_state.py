@@ -0,0 +1,136 @@
+"""
+Run-state journal of the Monthly Bulletin workbooks waiting in the working directory.
+
+Every workbook is identified by the SHA-256 of its bytes and gets an entry in '.sama_run_state.json' recording
+which stages finished ('scrape', 'archive') and, per destination table, when it was loaded and audited:
+
+    {sha256: {'file_name': ..., 'started_at': ..., 'updated_at': ...,
+              'stages': {'scrape': '2024-05-01T06:00:00', ...},
+              'tables': {table_name: {'loaded_at': ..., 'rows': 36, 'columns': 12, 'seconds': '0.52',
+                                      'audited_at': ...}}}}
+
+When a run stops half-way (a table failing to load, the server going down) the next run only transforms the
+sheets and loads the tables which are still missing, audits the tables not audited yet, and the workbook is
+archived once every table is loaded and audited. The file is replaced atomically after every change.
+"""
+
+import json
+import logging
+import threading
+from datetime import datetime
+
+import SAMA_archive_manifest as am
+
+RUN_STATE_FILE = '.sama_run_state.json'
+
+# Serialises read-modify-write cycles of the journal when tables finish loading in several threads
+_state_lock = threading.RLock()
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec='seconds')
+
+
+def load_state(state_path: str = RUN_STATE_FILE) -> dict:
+    """
+    Load the journal.
+
+    Returns:
+        dict: Mapping sha256 -> entry, empty when the journal does not exist or cannot be read.
+    """
+    try:
+        with _state_lock, open(state_path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+    except (ValueError, OSError) as error:
+        logging.warning(f"Starting a new run-state journal, {state_path} is unreadable: {error}")
+        return {}
+
+
+def save_state(state: dict, state_path: str = RUN_STATE_FILE):
+    """
+    Write the journal, replacing the previous file atomically.
+    """
+    with _state_lock:
+        am.atomic_write_json(state_path, state)
+
+
+def _update_entry(sha256: str, update, state_path: str) -> dict:
+    with _state_lock:
+        state = load_state(state_path)
+        entry = state.setdefault(sha256, {'file_name': None, 'started_at': _now(), 'stages': {}, 'tables': {}})
+        update(entry)
+        entry['updated_at'] = _now()
+        save_state(state, state_path)
+        return entry
+
+
+def start_workbook(sha256: str, file_name: str, state_path: str = RUN_STATE_FILE) -> dict:
+    """
+    Return the entry of a workbook about to be processed, created if needed.
+
+    A workbook archived before and put back in the working directory gets a new entry, so it is processed again.
+
+    Returns:
+        dict: The entry of the workbook.
+    """
+    def update(entry):
+        if 'archive' in entry['stages']:
+            logging.info(f"{file_name} was archived before, processing it again")
+            entry.update({'started_at': _now(), 'stages': {}, 'tables': {}})
+        entry['file_name'] = file_name
+
+    return _update_entry(sha256, update, state_path)
+
+
+def mark_stage(sha256: str, stage: str, state_path: str = RUN_STATE_FILE, **details) -> dict:
+    """
+    Record that a stage finished for a workbook, e.g. mark_stage(sha256, 'scrape', url=...).
+    """
+    def update(entry):
+        entry['stages'][stage] = _now()
+        if details:
+            entry.setdefault('details', {}).setdefault(stage, {}).update(details)
+
+    return _update_entry(sha256, update, state_path)
+
+
+def mark_tables(sha256_list: list, table_names: list, step: str, state_path: str = RUN_STATE_FILE, details: dict = None):
+    """
+    Record that tables were loaded or audited for the workbooks they were built from, in one write.
+
+    Args:
+        sha256_list (list): Digests of the workbooks merged into the tables.
+        table_names (list): Destination tables.
+        step (str): 'loaded' or 'audited'.
+        details (dict, optional): Table name -> values kept with the table, e.g. {'rows': 36, 'columns': 12}.
+    """
+    if not sha256_list or not table_names:
+        return
+    with _state_lock:
+        state = load_state(state_path)
+        now = _now()
+        for sha256 in sha256_list:
+            entry = state.setdefault(sha256, {'file_name': None, 'started_at': now, 'stages': {}, 'tables': {}})
+            for table_name in table_names:
+                table = entry['tables'].setdefault(table_name, {})
+                table[f"{step}_at"] = now
+                table.update((details or {}).get(table_name, {}))
+            entry['updated_at'] = now
+        save_state(state, state_path)
+
+
+def pending_tables(entry: dict, table_names: list, step: str = 'loaded') -> list:
+    """
+    Return the tables of `table_names` not loaded (or not audited) yet for a workbook.
+    """
+    return [table_name for table_name in table_names
+            if f"{step}_at" not in entry.get('tables', {}).get(table_name, {})]
+
+
+def is_complete(entry: dict, table_names: list) -> bool:
+    """
+    Return True when every table was loaded and audited for a workbook, so it can be archived.
+    """
+    return not pending_tables(entry, table_names, 'loaded') and not pending_tables(entry, table_names, 'audited')
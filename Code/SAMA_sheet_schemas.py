@@ -0,0 +1,142 @@
+"""
+Declarative registry of the Monthly Bulletin sheets loaded by the ETL.
+
+Every sheet is described by one entry of SHEET_SCHEMAS instead of code:
+
+- table_prefix: first part of the destination table names ('<prefix>_Year', '<prefix>_Quarter', '<prefix>_Month')
+- marker: title of the period column, the data of the sheet starts at the row holding it
+- columns: fixed mapping of the 'Unnamed: n' columns to column names, or
+- measures + title_replacements: the columns are named from the titles of the marker row, one column per measure
+  and title ('Restaurants & Café' -> 'Number_of_Transactions_Restaurants_and_Café', 'Sales_Restaurants_and_Café')
+- drop_columns: generated column names removed from the list
+- na_values: cell texts meaning "no value" (e.g. '---')
+- integer_marker / float_marker: columns whose name contains them are cast to Int64 / Float64
+
+Onboarding another SAMA sheet (30a, 30b, the banking tables) means adding an entry here or calling
+`register_sheet`. The column names and dtype plans compiled from an entry are cached, so a batch of bulletins
+with the same layout builds them once.
+"""
+
+from types import MappingProxyType
+from functools import lru_cache
+
+# Title of the period column of the SAMA sheets
+PERIOD_MARKER = 'الفترة'
+
+DEFAULT_SCHEMA = {
+    'marker': PERIOD_MARKER,
+    'columns': None,
+    'measures': (),
+    'title_replacements': (),
+    'drop_columns': (),
+    'na_values': (),
+    'integer_marker': 'Number',
+    'float_marker': 'Sales',
+}
+
+SHEET_SCHEMAS = {
+    '30c': {
+        'table_prefix': 'SAMA_POINTS_OF_SALE_AND_TRANSACTIONS_by',
+        'columns': {
+            'Unnamed: 1': 'Period',
+            'Unnamed: 3': 'Sales_Total_Points_Of_Sale_Transactions',
+            'Unnamed: 4': 'Number_of_Transactions_Total_Points_Of_Sale_Transactions',
+            'Unnamed: 5': 'Number_of_Points_of_Sale_Terminals',
+            'Unnamed: 7': 'Number_of_Mobile_Transactions_Points_of_Sale_Transactions_Using_Near_Field_Communication_Technology',
+            'Unnamed: 8': 'Number_of_Cards_Transactions_Points_of_Sale_Transactions_Using_Near_Field_Communication_Technology',
+            'Unnamed: 10': 'Sales_Using_Mobile_Points_of_Sale_Transactions_Using_Near_Field_Communication_Technology',
+            'Unnamed: 11': 'Sales_Using_Cards_Points_of_Sale_Transactions_Using_Near_Field_Communication_Technology',
+            'Unnamed: 13': 'Sales_ECommerce_Transactions_Using_Mada_Cards',
+            'Unnamed: 14': 'Number_of_Transactions_Transactions_Using_Mada_Cards',
+        },
+        'na_values': ('---',),
+    },
+    '30d': {
+        'table_prefix': 'SAMA_Points_of_Sale_Transactions_by_Sectors_by',
+        'measures': ('Number_of_Transactions', 'Sales'),
+        'title_replacements': (('*', ''), ('&', 'and'), (' ', '_')),
+    },
+    '30e': {
+        'table_prefix': 'SAMA_Points_of_Sale_Transactions_by_Main_Cities_by',
+        'measures': ('Number_of_Transactions', 'Sales', 'Number_of_Terminals'),
+        'title_replacements': (('-', ''),),
+        # the repeated period column at the end of the sheet
+        'drop_columns': ('Number_of_Terminals_الفترة',),
+    },
+}
+
+
+def register_sheet(sheet_name: str, **schema):
+    """
+    Add or replace the schema of a sheet.
+
+    Args:
+        sheet_name (str): Name of the sheet in the workbook.
+        **schema: Keys of DEFAULT_SCHEMA plus the required 'table_prefix'.
+
+    Raises:
+        ValueError: If the schema has unknown keys, no table prefix, or no column naming rule.
+    """
+    unknown = set(schema) - set(DEFAULT_SCHEMA) - {'table_prefix'}
+    if unknown:
+        raise ValueError(f"Unknown schema keys for sheet {sheet_name}: {sorted(unknown)}")
+    if 'table_prefix' not in schema:
+        raise ValueError(f"Schema of sheet {sheet_name} has no table_prefix")
+    if schema.get('columns') is None and not schema.get('measures'):
+        raise ValueError(f"Schema of sheet {sheet_name} needs either columns or measures")
+
+    SHEET_SCHEMAS[sheet_name] = schema
+    get_schema.cache_clear()
+    column_names.cache_clear()
+    dtype_plan.cache_clear()
+
+
+@lru_cache(maxsize=None)
+def get_schema(sheet_name: str):
+    """
+    Return the schema of a sheet with the defaults filled in (read-only).
+
+    Raises:
+        KeyError: If the sheet is not registered.
+    """
+    return MappingProxyType({**DEFAULT_SCHEMA, **SHEET_SCHEMAS[sheet_name]})
+
+
+@lru_cache(maxsize=None)
+def column_names(sheet_name: str, columns: tuple, titles: tuple) -> tuple:
+    """
+    Compile the column names of a sheet.
+
+    Args:
+        sheet_name (str): Name of the sheet.
+        columns (tuple): Current column names ('Unnamed: 1', ...).
+        titles (tuple): Non-empty titles of the marker row, except the period column.
+
+    Returns:
+        tuple: New column names, 'Period' first.
+    """
+    schema = get_schema(sheet_name)
+    if schema['columns'] is not None:
+        return tuple(schema['columns'].get(column, column) for column in columns)
+
+    names = ['Period']
+    for title in titles:
+        title = title.strip()
+        for old, new in schema['title_replacements']:
+            title = title.replace(old, new)
+        names.extend(f"{measure}_{title}" for measure in schema['measures'])
+    return tuple(name for name in names if name not in schema['drop_columns'])
+
+
+@lru_cache(maxsize=None)
+def dtype_plan(sheet_name: str, columns: tuple):
+    """
+    Return the columns of a sheet cast to Int64 and to Float64.
+
+    Returns:
+        tuple: (integer columns, float columns)
+    """
+    schema = get_schema(sheet_name)
+    integer_columns = tuple(column for column in columns if schema['integer_marker'] in column)
+    float_columns = tuple(column for column in columns if schema['float_marker'] in column)
+    return integer_columns, float_columns
@@ -1,97 +1,616 @@
 import os
+import re
+import sys
+import json
+import time
+import threading
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from bs4 import BeautifulSoup
+from html.parser import HTMLParser
 from urllib.parse import urlparse, urljoin, unquote
 import logging
 
+import SAMA_archive_manifest as am
+import SAMA_run_state as rs
+import ETL_instrumentation as ins
+
 """
 We configure logging using basicConfig() to set the logging level to INFO. 
 This means that only messages with severity level INFO and higher will be logged.
 """
 logging.basicConfig(level=logging.INFO)
 
-def download_sama_xlsx_file(save_directory, archive_directory):
+# Size in bytes of every chunk written to disk while streaming a workbook
+CHUNK_SIZE = 1024 * 1024
+# (connect, read) timeouts in seconds, a stalled transfer fails instead of hanging the SSIS container
+REQUEST_TIMEOUT = (10, 60)
+# Number of times a dropped download is resumed with an HTTP Range request, waiting
+# BACKOFF_FACTOR * 2 ** (resume - 1) seconds (at most MAX_RESUME_DELAY) before each resume
+MAX_RESUME_ATTEMPTS = 5
+MAX_RESUME_DELAY = 30.0
+# Retries of a request failing with a connection error or one of RETRY_STATUS_CODES,
+# waiting BACKOFF_FACTOR * 2 ** (retry - 1) seconds between attempts
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 2.0
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+# Number of keep-alive connections kept open per host
+POOL_SIZE = 4
+# File inside the archive directory keeping the ETag/Last-Modified validators of every fetched URL
+HTTP_CACHE_FILE = 'http_cache.json'
+
+# URL of the SAMA Monthly Statistics page
+SAMA_URL = "https://www.sama.gov.sa/ar-sa/EconomicReports/Pages/MonthlyStatistics.aspx"
+"""
+User-Agent: describe the client/ machine which connect with the server
+"""
+#HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.6422.61 Safari/537.36'}
+HEADERS = {'User-Agent': 'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)'}
+
+def load_http_cache(cache_path):
+    """
+    Load the conditional-GET cache (url -> {'etag', 'last_modified'}) from disk.
+
+    Args:
+    - cache_path (str): Path of the JSON cache file.
+
+    Returns:
+    - cache (dict): The cached validators, empty if the file is missing or unreadable.
+    """
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return {}
+    except (ValueError, OSError) as error:
+        logging.warning(f"Ignoring unreadable HTTP cache {cache_path}: {error}")
+        return {}
+
+def save_http_cache(cache_path, cache):
+    """
+    Write the conditional-GET cache to disk, replacing the previous file atomically.
+
+    Args:
+    - cache_path (str): Path of the JSON cache file.
+    - cache (dict): The validators to store.
+    """
+    am.atomic_write_json(cache_path, cache)
+
+def conditional_headers(cache, url, headers):
+    """
+    Return a copy of `headers` with If-None-Match / If-Modified-Since set from the validators cached for `url`.
+    """
+    request_headers = dict(headers)
+    validators = cache.get(url, {})
+    if validators.get('etag'):
+        request_headers['If-None-Match'] = validators['etag']
+    if validators.get('last_modified'):
+        request_headers['If-Modified-Since'] = validators['last_modified']
+    return request_headers
+
+def remember_validators(cache, url, response):
+    """
+    Store the ETag and Last-Modified headers of `response` for `url` in the cache dictionary.
+    """
+    validators = {
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+    }
+    if any(validators.values()):
+        cache[url] = validators
+    else:
+        cache.pop(url, None)
+
+class _RateLimitedRetry(Retry):
+    """
+    Retry calling `before_retry()` after its backoff delay, so the retries sent by urllib3 inside the session
+    also wait for the rate limiter of the client.
+    """
+    before_retry = None
+
+    def new(self, **kw):
+        retry = super().new(**kw)
+        retry.before_retry = self.before_retry
+        return retry
+
+    def sleep(self, response=None):
+        super().sleep(response)
+        if self.before_retry:
+            self.before_retry()
+
+class ScraperClient:
+    """
+    Pooled HTTP client of the scraper.
+
+    One keep-alive session with connect/read timeouts and exponential-backoff retries on connection errors
+    and 5xx/429 answers. Every request is timed, see `latency_summary()`.
+    With a `rate_limiter` (an object with a wait(url) method, e.g. Backfill_SAMA_Data.HostRateLimiter) every
+    request waits for it, the Range resumes and the retries of the session included.
+    Can be used as a context manager to close the pooled connections.
+    """
+
+    def __init__(self, headers=None, timeout=REQUEST_TIMEOUT, max_retries=MAX_RETRIES,
+                 backoff_factor=BACKOFF_FACTOR, pool_size=POOL_SIZE, rate_limiter=None):
+        self.timeout = timeout
+        self.latencies = []  # list of (method, url, status code or None, seconds)
+        self.rate_limiter = rate_limiter
+        # URL of the request being sent by each thread, for the rate limiter of its retries
+        self._current = threading.local()
+
+        retry = _RateLimitedRetry(total=max_retries, connect=max_retries, read=max_retries, status=max_retries,
+                                  backoff_factor=backoff_factor, status_forcelist=RETRY_STATUS_CODES,
+                                  allowed_methods=frozenset(['GET', 'HEAD']), raise_on_status=False)
+        if rate_limiter is not None:
+            retry.before_retry = self._wait_for_rate_limiter
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+        self.session = requests.Session()
+        self.session.headers.update(HEADERS if headers is None else headers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def request(self, method, url, **kwargs):
+        """
+        Send a request through the pooled session, using the client timeout unless one is given.
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        self._current.url = url
+        self._wait_for_rate_limiter()
+        start_time = time.perf_counter()
+        status = None
+        try:
+            response = self.session.request(method, url, **kwargs)
+            status = response.status_code
+            return response
+        finally:
+            # for streamed responses this is the time until the headers arrived, retries included
+            self.latencies.append((method, url, status, time.perf_counter() - start_time))
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def _wait_for_rate_limiter(self):
+        if self.rate_limiter is not None:
+            self.rate_limiter.wait(self._current.url)
+
+    def latency_summary(self):
+        """
+        Return the number of requests and their total, min, median, p95 and max latency in seconds.
+        """
+        seconds = sorted(latency for _, _, _, latency in self.latencies)
+        if not seconds:
+            return {'requests': 0}
+        return {
+            'requests': len(seconds),
+            'total': round(sum(seconds), 3),
+            'min': round(seconds[0], 3),
+            'p50': round(seconds[len(seconds) // 2], 3),
+            'p95': round(seconds[min(len(seconds) - 1, int(len(seconds) * 0.95))], 3),
+            'max': round(seconds[-1], 3),
+            'errors': sum(1 for _, _, status, _ in self.latencies if status is None or status >= 400),
+        }
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def _content_total_size(response, downloaded):
+    """
+    Return the full size of the remote file from the response headers, or None if the server does not send it.
+
+    Args:
+    - response: The streamed requests response.
+    - downloaded (int): Number of bytes already in the '.part' file.
+    """
+    content_range = response.headers.get('Content-Range')
+    if response.status_code == 206 and content_range and '/' in content_range:
+        total = content_range.rsplit('/', 1)[1]
+        return int(total) if total.isdigit() else None
+
+    content_length = response.headers.get('Content-Length')
+    if content_length and content_length.isdigit():
+        return downloaded + int(content_length) if response.status_code == 206 else int(content_length)
+    return None
+
+def _read_part_validators(validators_path):
+    """
+    Return the validators ({'url', 'etag', 'last_modified'}) saved with a '.part' file, None if there are none.
+    """
+    try:
+        with open(validators_path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+def _discard_partial(part_file_path):
+    """
+    Delete a '.part' file and its validators.
+    """
+    for path in (part_file_path, part_file_path + '.json'):
+        if os.path.exists(path):
+            os.remove(path)
+
+def _if_range_value(validators):
+    """
+    Return the If-Range header of a resume: the ETag when it is strong (weak ones are not allowed), else Last-Modified.
+    """
+    etag = validators.get('etag')
+    if etag and not etag.startswith('W/'):
+        return etag
+    return validators.get('last_modified')
+
+def _same_version(validators, response):
+    """
+    Tell whether a 206 response belongs to the version of the file the '.part' was started from.
+    """
+    for key, header in (('etag', 'ETag'), ('last_modified', 'Last-Modified')):
+        if validators.get(key) and response.headers.get(header) and validators[key] != response.headers[header]:
+            return False
+    return True
+
+def stream_download_file(file_url, local_file_path, headers, chunk_size=CHUNK_SIZE, timeout=REQUEST_TIMEOUT,
+                         max_resumes=MAX_RESUME_ATTEMPTS, http_cache=None, session=None, backoff_factor=BACKOFF_FACTOR):
+    """
+    Stream a file to disk in chunks and resume it with HTTP Range requests after a dropped connection.
+
+    The data is written to '<local_file_path>.part' and renamed to `local_file_path` only when the
+    size on disk matches the size announced by the server (Content-Length / Content-Range).
+    The ETag / Last-Modified of the response which started the '.part' are kept in '<local_file_path>.part.json'
+    and sent as If-Range with every resume, so a file re-uploaded under the same name is downloaded again in full
+    instead of being appended to the bytes of the previous version. A '.part' without validators is not resumed.
+
+    Args:
+    - file_url (str): URL of the file to download.
+    - local_file_path (str): Final path of the downloaded file.
+    - headers (dict): HTTP headers sent with every request.
+    - chunk_size (int): Number of bytes written to disk per chunk.
+    - timeout (tuple): (connect, read) timeouts in seconds.
+    - max_resumes (int): How many times an interrupted download is resumed.
+    - http_cache (dict, optional): Conditional-GET cache; when given the first request is conditional
+                                   and the validators of the downloaded file are stored in it.
+    - session (ScraperClient | requests.Session, optional): Client whose keep-alive connections are reused.
+    - backoff_factor (float): Base delay in seconds before a resume, resume n waits backoff_factor * 2 ** (n - 1).
+
+    Returns:
+    - local_file_path (str): Path of the completed file, None if the server answered 304 Not Modified.
+
+    Raises:
+    - requests.exceptions.RequestException: If the server answers with an error status.
+    - IOError: If the file is still incomplete after all resume attempts or is bigger than expected.
+    """
+    part_file_path = local_file_path + '.part'
+    validators_path = part_file_path + '.json'
+    http = session or requests
+
+    for attempt in range(max_resumes + 1):
+        if attempt:
+            time.sleep(min(backoff_factor * 2 ** (attempt - 1), MAX_RESUME_DELAY))
+        downloaded = os.path.getsize(part_file_path) if os.path.exists(part_file_path) else 0
+        validators = _read_part_validators(validators_path) if downloaded else None
+        if downloaded and (validators is None or validators.get('url') != file_url):
+            logging.info(f"Discarding {part_file_path}, it cannot be matched with the current version of {file_url}")
+            _discard_partial(part_file_path)
+            downloaded = 0
+
+        # identity encoding keeps the bytes on disk comparable with Content-Length
+        request_headers = dict(headers, **{'Accept-Encoding': 'identity'})
+        if http_cache is not None and not downloaded:
+            request_headers = conditional_headers(http_cache, file_url, request_headers)
+        if downloaded:
+            request_headers['Range'] = f"bytes={downloaded}-"
+            # the server sends the whole file (200) instead of the range when it changed since the '.part' was started
+            if _if_range_value(validators):
+                request_headers['If-Range'] = _if_range_value(validators)
+            logging.info(f"Resuming download of {file_url} from byte {downloaded}")
+
+        try:
+            with http.get(file_url, headers=request_headers, stream=True, timeout=timeout) as response:
+                if response.status_code == 304:
+                    logging.info(f"{file_url} not modified since the last download.")
+                    return None
+
+                if response.status_code == 416:
+                    # Range not satisfiable: the '.part' file is either complete or stale ('bytes */<total>')
+                    total = response.headers.get('Content-Range', '').rsplit('/', 1)[-1]
+                    if total.isdigit() and int(total) == downloaded:
+                        break
+                    _discard_partial(part_file_path)
+                    continue
+
+                response.raise_for_status()
+
+                if downloaded and response.status_code == 206 and not _same_version(validators, response):
+                    # a server ignoring If-Range still sends the range of the new version
+                    logging.warning(f"{file_url} changed since the download started, downloading it again")
+                    _discard_partial(part_file_path)
+                    continue
+                # the whole file again: the server ignored the Range header or the file changed (If-Range)
+                if downloaded and response.status_code != 206:
+                    downloaded = 0
+
+                total_size = _content_total_size(response, downloaded)
+                if http_cache is not None:
+                    remember_validators(http_cache, file_url, response)
+                if not downloaded:
+                    with open(validators_path, 'w', encoding='utf-8') as file:
+                        json.dump({'url': file_url, 'etag': response.headers.get('ETag'),
+                                   'last_modified': response.headers.get('Last-Modified')}, file)
+                with open(part_file_path, 'ab' if downloaded else 'wb') as file:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        if chunk:
+                            file.write(chunk)
+
+        except (requests.exceptions.ConnectionError,
+                requests.exceptions.ChunkedEncodingError,
+                requests.exceptions.Timeout) as error:
+            logging.warning(f"Download interrupted (attempt {attempt + 1}/{max_resumes + 1}): {error}")
+            continue
+
+        downloaded = os.path.getsize(part_file_path)
+        if total_size is None or downloaded == total_size:
+            break
+        if downloaded > total_size:
+            _discard_partial(part_file_path)
+            raise IOError(f"Downloaded {downloaded} bytes but server announced {total_size} bytes for {file_url}")
+        logging.warning(f"Incomplete download ({downloaded}/{total_size} bytes), resuming...")
+    else:
+        raise IOError(f"Download of {file_url} is still incomplete after {max_resumes} resume attempts")
+
+    os.replace(part_file_path, local_file_path)
+    _discard_partial(part_file_path)
+    return local_file_path
+
+# Cheap pre-scan: a page without any '.xlsx' href is never parsed
+_XLSX_HREF_PATTERN = re.compile(rb"""href\s*=\s*(?:"[^"]*\.xlsx"|'[^']*\.xlsx'|[^\s"'>]*\.xlsx)""", re.IGNORECASE)
+# Size of the pieces of the page fed to the streaming parser
+PARSER_FEED_SIZE = 64 * 1024
+
+class _StopParsing(Exception):
+    """Raised by _XlsxLinkParser to stop feeding the page once the first link is found."""
+
+class _XlsxLinkParser(HTMLParser):
+    """
+    Streaming parser collecting the href of <a> tags ending with '.xlsx' (any case, like _XLSX_HREF_PATTERN),
+    without building a document tree.
+    """
+
+    def __init__(self, first_only=False):
+        super().__init__(convert_charrefs=True)
+        self.first_only = first_only
+        self.links = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag != 'a':
+            return
+        for name, value in attrs:
+            if name == 'href' and value and value.lower().endswith('.xlsx'):
+                self.links.append(value)
+                if self.first_only:
+                    raise _StopParsing()
+                return
+
+def _find_xlsx_hrefs_fast(html, first_only=False):
+    """
+    Return the .xlsx hrefs of the page with the streaming parser, stopping at the first one if `first_only`.
+    """
+    if isinstance(html, bytes):
+        html = html.decode('utf-8', errors='replace')
+
+    parser = _XlsxLinkParser(first_only)
+    try:
+        for start in range(0, len(html), PARSER_FEED_SIZE):
+            parser.feed(html[start:start + PARSER_FEED_SIZE])
+        parser.close()
+    except _StopParsing:
+        pass
+    return parser.links
+
+def _find_xlsx_hrefs_soup(html, first_only=False):
+    """
+    Return the .xlsx hrefs of the page with a full BeautifulSoup tree.
+    """
+    # Parse HTML
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # Filter links to find the ones with .xlsx extension
+    hrefs = []
+    for link in soup.find_all('a', href=True):
+        href = link.get('href')
+        if href and href.lower().endswith('.xlsx'):
+            hrefs.append(href)
+            if first_only:
+                break
+    return hrefs
+
+def find_xlsx_links(html, page_url, first_only=False, fast=True):
     """
-    Download an Excel file (.xlsx) from the SAMA Monthly Statistics page in current working directory if doesn't exist in Archive directory
+    Find the links to .xlsx files in an HTML page.
 
+    The fast path pre-scans the raw page with a regex and then runs a streaming HTMLParser that stops
+    at the first match; BeautifulSoup is used when `fast` is False or when the fast path finds nothing
+    although the pre-scan saw an .xlsx href.
+
+    Args:
+    - html (bytes | str): Content of the page.
+    - page_url (str): URL of the page, used to build absolute file URLs.
+    - first_only (bool): Stop at the first .xlsx link (the latest bulletin).
+    - fast (bool): Use the regex pre-scan and streaming parser instead of BeautifulSoup.
+
+    Returns:
+    - xlsx_links (list): Absolute URLs of the .xlsx files in page order, without duplicates.
+    """
+    hrefs = []
+    if fast:
+        raw = html.encode('utf-8') if isinstance(html, str) else html
+        if not _XLSX_HREF_PATTERN.search(raw):
+            return []
+        try:
+            hrefs = _find_xlsx_hrefs_fast(html, first_only)
+        except Exception as error:
+            logging.warning(f"Fast link extraction failed, falling back to BeautifulSoup: {error}")
+    if not hrefs:
+        hrefs = _find_xlsx_hrefs_soup(html, first_only)
+
+    # Create the full URL of the Excel files from the site root
+    base_url = urlparse(page_url)
+    site_root = f"{base_url.scheme}://{base_url.netloc}"
+    return list(dict.fromkeys(urljoin(site_root, href) for href in hrefs))
+
+def file_name_from_url(file_url):
+    """
+    Return the decoded file name of a URL, e.g. '.../Monthly_Bulletin%20X.xlsx' -> 'Monthly_Bulletin X.xlsx'.
+    """
+    # Parse the file name from the URL and decode URL-encoded file name if necessary
+    return unquote(os.path.basename(urlparse(file_url).path))
+
+def register_download(file_path, file_url, archive_directory):
+    """
+    Check by content (not by name) if a downloaded workbook was already processed and archived.
+
+    A duplicate is deleted, a new workbook is recorded in the archive manifest and in the run-state journal
+    of the ETL next to it.
+
+    Args:
+    - file_path (str): Path of the downloaded workbook.
+    - file_url (str): URL the workbook was downloaded from.
+    - archive_directory (str): The 'Archive' directory.
+
+    Returns:
+    - file_path (str): Path of the new workbook, None if its content is already archived.
+    """
+    sha256 = am.file_sha256(file_path)
+    if am.is_archived(am.load_manifest(archive_directory), sha256):
+        logging.info(f"File content already exists in archive (sha256 {sha256[:12]}). Skipping {file_path}.")
+        os.remove(file_path)
+        return None
+
+    am.record_download(archive_directory, file_path, url=file_url, sha256=sha256)
+    rs.mark_stage(sha256, 'scrape', state_path=os.path.join(os.path.dirname(os.path.abspath(file_path)), rs.RUN_STATE_FILE),
+                  url=file_url)
+    logging.info(f"File downloaded successfully as: {file_path}")
+    return file_path
+
+def download_sama_xlsx_file(save_directory, archive_directory, streaming=True, use_http_cache=True, client=None):
+    """
+    Download an Excel file (.xlsx) from the SAMA Monthly Statistics page in current working directory if its content doesn't exist in Archive directory
+
+    Args:
+    - save_directory (str): Directory where the downloaded file is saved.
+    - archive_directory (str): Directory holding the already processed files.
+    - streaming (bool): If True the workbook is streamed to disk in chunks with timeouts and resume support,
+                        otherwise it is downloaded in memory and written at once.
+    - use_http_cache (bool): If True the page and the workbook are fetched with conditional GET requests
+                             (If-None-Match / If-Modified-Since) and a 304 answer ends the run early.
+    - client (ScraperClient, optional): Pooled HTTP client, a new one is created (and closed) if not given.
+
+    Returns:
+    - local_file_path (str): Path of the downloaded file, None if nothing was downloaded.
+
+    Raises:
+    - requests.exceptions.RequestException, IOError, ValueError: After logging, so the caller
+      (and the SSIS container) sees the failure.
     """
-    archive_found = False # change to true if file exist in Archive directory
     # Ensure the archive directory exists
     if not os.path.exists(archive_directory):
         os.makedirs(archive_directory)
         logging.info(f"Created archive directory: {archive_directory}")
+
+    cache_path = os.path.join(archive_directory, HTTP_CACHE_FILE)
+    http_cache = load_http_cache(cache_path) if use_http_cache else {}
+    own_client = client is None
+    client = client or ScraperClient()
     try:
-        # URL of the SAMA Monthly Statistics page
-        url = "https://www.sama.gov.sa/ar-sa/EconomicReports/Pages/MonthlyStatistics.aspx"
-        """
-        User-Agent: describe the client/ machine which connect with the server
-        """
-        #headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/125.0.6422.61 Safari/537.36'}
-        headers = {'User-Agent': 'Mozilla/5.0 (compatible; Googlebot/2.1; +http://www.google.com/bot.html)'}
+        url = SAMA_URL
+        headers = HEADERS
         # Send a GET request to the URL
-        response = requests.get(url, headers=headers)
+        response = client.get(url, headers=conditional_headers(http_cache, url, headers))
+
+        # Nothing changed on the page since the last successful run, skip parsing and downloading
+        if response.status_code == 304:
+            logging.info("SAMA Monthly Statistics page not modified since the last run. Skipping download.")
+            return None
     
         # Raise an HTTPError for bad status codes
         response.raise_for_status()
 
-        # Parse HTML
-        soup = BeautifulSoup(response.content, 'html.parser')
-
-        # Find all links on the page
-        links = soup.find_all('a', href=True)
+        # Parse HTML and keep the first link with .xlsx extension
+        xlsx_links = find_xlsx_links(response.content, url, first_only=True)
 
-        # Filter links to find the one with .xlsx extension
-        xlsx_link = None
-        for link in links:
-            href = link.get('href')
-            if href and href.endswith('.xlsx'):
-                xlsx_link = href
-                break
-
-        if not xlsx_link:
+        if not xlsx_links:
             raise ValueError("No .xlsx file found on the page.")
 
-        # Create the full URL of the Excel file
-        base_url = urlparse(url)
-        file_url = urljoin(f"{base_url.scheme}://{base_url.netloc}", xlsx_link)
-
-        # Parse the file name from the URL
-        parsed_url = urlparse(file_url)
-        file_name = os.path.basename(parsed_url.path)
-
-        # Decode URL-encoded file name if necessary
-        file_name = unquote(file_name)
+        file_url = xlsx_links[0]
 
-        # Define the local file path and archive file path
+        # Define the local file path
      
-        local_file_path = os.path.join(save_directory, file_name)
-        archive_file_path = os.path.join(archive_directory, file_name) 
-
-        # Check if file already exists in archive
-        if os.path.exists(archive_file_path):
-            logging.info(f"File already exists in archive. Skipping download.")
-            archive_found = True
-        
-        elif archive_found==False: 
-            logging.info("The file not in Archive, Start Downloading...")
-            # Download the file inside the current working directory
-            response = requests.get(file_url, headers=headers)
-            if response.status_code == 200:
+        local_file_path = os.path.join(save_directory, file_name_from_url(file_url))
+
+        logging.info("Start Downloading...")
+        # Download the file inside the current working directory
+        if streaming:
+            downloaded_file_path = stream_download_file(file_url, local_file_path, headers, session=client,
+                                                        http_cache=http_cache if use_http_cache else None)
+        else:
+            downloaded_file_path = None
+            file_response = client.get(file_url, headers=conditional_headers(http_cache, file_url, headers))
+            file_response.raise_for_status()
+            if file_response.status_code == 200:
                 with open(local_file_path, 'wb') as file:
-                    file.write(response.content)
+                    file.write(file_response.content)
+                remember_validators(http_cache, file_url, file_response)
+                downloaded_file_path = local_file_path
+
+        if downloaded_file_path:
+            downloaded_file_path = register_download(downloaded_file_path, file_url, archive_directory)
+        else:
+            logging.info("The file was not modified since the last download. Skipping.")
 
-                logging.info(f"File downloaded successfully as: {local_file_path}")        
+        # Only remember the page once its workbook is safely handled, so a failed run is retried in full
+        if use_http_cache:
+            remember_validators(http_cache, url, response)
+            save_http_cache(cache_path, http_cache)
+
+        return downloaded_file_path
 
     except requests.exceptions.RequestException as e:
         logging.error(f"Error downloading file: {e}")
+        raise
+    except IOError as ioe:
+        logging.error(f"Error downloading file: {ioe}")
+        raise
     except ValueError as ve:
         logging.error(ve)
+        raise
+    finally:
+        logging.info(f"HTTP request latency (seconds): {client.latency_summary()}")
+        if own_client:
+            client.close()
 
-#save in current working directory
-save_directory = os.getcwd()
-archive_directory = os.path.join(save_directory, 'Archive') # Join the current working directory with the subdirectory 'Archive'
+if __name__ == '__main__':
+    #save in current working directory
+    save_directory = os.getcwd()
+    archive_directory = os.path.join(save_directory, 'Archive') # Join the current working directory with the subdirectory 'Archive'
 
-# Call the function:
-downloaded_file_name = download_sama_xlsx_file(save_directory, archive_directory)
-if downloaded_file_name:
-    print(f"Downloaded file name: {downloaded_file_name}")
+    # Call the function, a failure ends the script with exit status 1 so the SSIS container fails too
+    ins.log_to_file(ins.METRICS_FILE)
+    # SAMA_PROFILE=1 or --profile also writes a profile of the download, tagged with the bulletin file name
+    try:
+        with ins.profiled('scrape') as profile, ins.stage('scrape') as record:
+            downloaded_file_name = download_sama_xlsx_file(save_directory, archive_directory)
+            if downloaded_file_name:
+                record['file'] = profile.tag = os.path.basename(downloaded_file_name)
+                record['bytes'] = os.path.getsize(downloaded_file_name)
+            else:
+                profile.tag = 'no-download'
+    except Exception:
+        # the traceback is the only trace the SSIS job leaves of the failure
+        logging.exception("SAMA download failed")
+        sys.exit(1)
+    if downloaded_file_name:
+        print(f"Downloaded file name: {downloaded_file_name}")
@@ -0,0 +1,193 @@
+"""
+Backfill_SAMA_Data against a stand-in SAMA server on localhost.
+
+    python -m unittest discover Tests      (or: python -m pytest Tests)
+
+The server serves workbooks of different sizes under /bulletins/..., counts the requests in flight and the
+requests of every path, drops one transfer half-way (resumed with a Range request) and answers one request with
+503 (retried by the client).
+"""
+
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Code'))
+
+import Backfill_SAMA_Data as b
+
+# seconds every answer takes, so concurrent downloads overlap
+RESPONSE_DELAY = 0.2
+# bigger than Scraping_SAMA_Data.CHUNK_SIZE, so the dropped transfer leaves a '.part' to resume
+LARGE_SIZE = 3 * 1024 * 1024
+
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, files):
+        super().__init__(('127.0.0.1', 0), BulletinHandler)
+        self.files = files  # path -> bytes
+        self.drop_once = set()  # paths whose first transfer stops half-way
+        self.fail_once = set()  # paths whose first request is answered with 503
+        self.requests = []  # (path, Range header, If-Range header, status)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def url(self, path):
+        return f"http://127.0.0.1:{self.server_port}{path}"
+
+
+class BulletinHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+        try:
+            time.sleep(RESPONSE_DELAY)
+            self._answer(server)
+        finally:
+            with server.lock:
+                server.in_flight -= 1
+
+    def _answer(self, server):
+        path = self.path
+        body = server.files.get(path)
+        range_header = self.headers.get('Range')
+        etag = f'"{len(body)}"' if body is not None else None
+        with server.lock:
+            fail = path in server.fail_once
+            server.fail_once.discard(path)
+            drop = path in server.drop_once and not range_header
+            server.drop_once.discard(path)
+
+        if body is None or fail:
+            status = 404 if body is None else 503
+            server.requests.append((path, range_header, self.headers.get('If-Range'), status))
+            self.send_response(status)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+
+        start = 0
+        if range_header and self.headers.get('If-Range') in (None, etag):
+            start = int(range_header.split('=', 1)[1].rstrip('-'))
+            self.send_response(206)
+            self.send_header('Content-Range', f"bytes {start}-{len(body) - 1}/{len(body)}")
+            status = 206
+        else:
+            self.send_response(200)
+            status = 200
+        server.requests.append((path, range_header, self.headers.get('If-Range'), status))
+        self.send_header('ETag', etag)
+        self.send_header('Content-Length', str(len(body) - start))
+        self.end_headers()
+        if drop:
+            self.wfile.write(body[start:start + len(body) // 2])
+            self.wfile.flush()
+            self.close_connection = True
+            self.connection.shutdown(2)
+            return
+        self.wfile.write(body[start:])
+
+
+class CountingRateLimiter(b.HostRateLimiter):
+
+    def __init__(self, min_interval):
+        super().__init__(min_interval)
+        self.waits = 0
+
+    def wait(self, url):
+        self.waits += 1
+        super().wait(url)
+
+
+class BackfillTest(unittest.TestCase):
+
+    def setUp(self):
+        self.files = {
+            '/bulletins/2024/Monthly_Bulletin_January.xlsx': b'january' * 1000,
+            '/bulletins/2024/Monthly_Bulletin_February.xlsx': b'february' * 1000,
+            '/bulletins/2024/Monthly_Bulletin_March.xlsx': os.urandom(LARGE_SIZE),
+            '/bulletins/2024/Monthly_Bulletin_April.xlsx': b'april' * 1000,
+            # same file name as the January bulletin, other content
+            '/bulletins/2023/Monthly_Bulletin_January.xlsx': b'january 2023' * 1000,
+        }
+        self.server = StandInServer(self.files)
+        self.server.drop_once.add('/bulletins/2024/Monthly_Bulletin_March.xlsx')
+        self.server.fail_once.add('/bulletins/2024/Monthly_Bulletin_April.xlsx')
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+        self.directory = tempfile.mkdtemp(prefix='sama_backfill_test_')
+        self.archive_directory = os.path.join(self.directory, 'Archive')
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def backfill(self, urls, max_workers=2, rate_limiter=None):
+        return b.backfill_sama_xlsx_files(self.directory, self.archive_directory, urls=urls, max_workers=max_workers,
+                                          min_request_interval=0, max_retries=2, backoff_factor=0, rate_limiter=rate_limiter)
+
+    def test_downloads_every_workbook_once_within_the_concurrency_limit(self):
+        urls = [self.server.url(path) for path in self.files]
+        rate_limiter = CountingRateLimiter(0)
+        # a URL listed twice is downloaded once
+        results = self.backfill(urls + urls[:1], max_workers=2, rate_limiter=rate_limiter)
+
+        self.assertEqual(set(results), set(urls))
+        self.assertFalse([error for error in results.values() if isinstance(error, Exception)])
+        self.assertLessEqual(self.server.max_in_flight, 2)
+        self.assertGreater(self.server.max_in_flight, 1)
+
+        full_downloads = [path for path, _, _, status in self.server.requests if status == 200]
+        self.assertCountEqual(full_downloads, list(self.files))
+
+        # the dropped transfer was resumed with If-Range, the 503 retried, both through the rate limiter
+        resumes = [request for request in self.server.requests if request[3] == 206]
+        self.assertEqual(len(resumes), 1)
+        self.assertEqual(resumes[0][0], '/bulletins/2024/Monthly_Bulletin_March.xlsx')
+        self.assertIsNotNone(resumes[0][2])
+        self.assertIn(503, [status for _, _, _, status in self.server.requests])
+        self.assertEqual(rate_limiter.waits, len(self.server.requests))
+
+        # the two January bulletins are kept under distinct names, each with its own content
+        contents = {}
+        for url, path in results.items():
+            with open(path, 'rb') as file:
+                contents[url] = file.read()
+        self.assertEqual(len(set(results.values())), len(urls))
+        for path, body in self.files.items():
+            self.assertEqual(contents[self.server.url(path)], body)
+        self.assertFalse([name for name in os.listdir(self.directory) if name.endswith(('.part', '.part.json'))])
+
+    def test_rate_limiter_spaces_requests_to_the_same_host(self):
+        rate_limiter = b.HostRateLimiter(0.1)
+        url = self.server.url('/bulletins/2024/Monthly_Bulletin_January.xlsx')
+        start = time.monotonic()
+        for _ in range(3):
+            rate_limiter.wait(url)
+        self.assertGreaterEqual(time.monotonic() - start, 0.2)
+
+    def test_local_file_names_are_unique(self):
+        urls = [self.server.url(path) for path in self.files]
+        names = b.local_file_names(urls)
+        self.assertEqual(len(set(names.values())), len(urls))
+        self.assertEqual(names[urls[1]], 'Monthly_Bulletin_February.xlsx')
+        self.assertTrue(all(name.startswith('Monthly_Bulletin_') and name.endswith('.xlsx') for name in names.values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,44 @@
+"""
+.xlsx link extraction of Scraping_SAMA_Data on the trimmed Monthly Statistics page of Benchmarks/.
+
+    python -m unittest discover Tests      (or: python -m pytest Tests)
+"""
+
+import os
+import sys
+import unittest
+
+TESTS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TESTS_DIRECTORY, '..', 'Code'))
+
+import Scraping_SAMA_Data as s
+
+SAVED_PAGE = os.path.join(TESTS_DIRECTORY, '..', 'Benchmarks', 'sama_monthly_statistics_page.html')
+BULLETIN_URL = 'https://www.sama.gov.sa/ar-sa/EconomicReports/MonthlyStatistics/'
+
+
+class LinkExtractionTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with open(SAVED_PAGE, 'rb') as file:
+            cls.html = file.read()
+
+    def test_fast_path_finds_the_latest_bulletin(self):
+        self.assertEqual(s.find_xlsx_links(self.html, s.SAMA_URL, first_only=True),
+                         [BULLETIN_URL + 'Monthly_Bulletin_September_2026.xlsx'])
+
+    def test_fast_path_matches_beautifulsoup(self):
+        links = s.find_xlsx_links(self.html, s.SAMA_URL)
+        self.assertEqual(links, s.find_xlsx_links(self.html, s.SAMA_URL, fast=False))
+        # 9 bulletins of 2026 and 12 of 2025, one of them with an upper-case extension, not the methodology PDF
+        self.assertEqual(len(links), 21)
+        self.assertIn(BULLETIN_URL + 'Monthly_Bulletin_March_2025.XLSX', links)
+
+    def test_upper_case_extension(self):
+        html = '<html><body><a href="/ar-sa/Pages/default.aspx">x</a><a href="/files/Monthly_Bulletin.XLSX">y</a></body></html>'
+        self.assertEqual(s.find_xlsx_links(html, s.SAMA_URL, first_only=True), ['https://www.sama.gov.sa/files/Monthly_Bulletin.XLSX'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+"""
+Streaming sheet reader of SAMA_refactor-V2 on workbooks whose <dimension> tag is wrong.
+
+    python -m unittest discover Tests      (or: python -m pytest Tests)
+
+Exported workbooks often keep a stale <dimension ref="..."/> in their sheets. openpyxl read-only mode trusts it,
+so the reader must read the sheet as it is, like pd.read_excel.
+"""
+
+import os
+import re
+import sys
+import shutil
+import zipfile
+import tempfile
+import unittest
+
+import pandas as pd
+
+TESTS_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(TESTS_DIRECTORY, '..', 'Benchmarks'))
+
+import synthetic_bulletin as sb
+from etl_module import load_etl_module
+
+
+def set_dimension(path, ref):
+    """
+    Rewrite the workbook with <dimension ref="`ref`"/> in every sheet.
+    """
+    temp_path = path + '.tmp'
+    with zipfile.ZipFile(path) as source, zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_DEFLATED) as target:
+        for item in source.infolist():
+            data = source.read(item.filename)
+            if item.filename.startswith('xl/worksheets/sheet'):
+                xml = re.sub(r'<dimension ref="[^"]*"/>', '', data.decode('utf-8'))
+                xml = xml.replace('</sheetPr>', f'</sheetPr><dimension ref="{ref}"/>', 1)
+                data = xml.encode('utf-8')
+            target.writestr(item, data)
+    os.replace(temp_path, path)
+
+
+class ReadSheetStreamingTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.etl = load_etl_module()
+        cls.directory = tempfile.mkdtemp(prefix='sama_streaming_test_')
+        cls.path = os.path.join(cls.directory, 'Monthly_Bulletin_Dimension.xlsx')
+        sb.make_workbook(cls.path, years=3, sectors=4, cities=3)
+        set_dimension(cls.path, 'A1:B1')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    def test_wrong_dimension_does_not_truncate_the_sheets(self):
+        streamed = self.etl.read_sheets(self.path, streaming=True, use_cache=False)
+        expected = self.etl.read_sheets(self.path, streaming=False, use_cache=False)
+        rows = 3 + 3 * 4 + 3 * 12
+
+        for sheet_name in self.etl.SHEET_NAMES:
+            with self.subTest(sheet=sheet_name):
+                self.assertEqual(streamed[sheet_name].shape, expected[sheet_name].shape)
+                # marker row, unit note, the data rows, two blank rows between the blocks and the source note
+                self.assertEqual(len(streamed[sheet_name]), rows + 5)
+                pd.testing.assert_series_equal(streamed[sheet_name]['Unnamed: 1'], expected[sheet_name]['Unnamed: 1'])
+
+    def test_wrong_dimension_keeps_the_newest_months(self):
+        transformed = self.etl.transform_data(list(self.etl.read_sheets(self.path, streaming=True, use_cache=False).items()))
+        for table_name in self.etl.destination_tables():
+            if table_name.endswith('_Month'):
+                with self.subTest(table=table_name):
+                    self.assertEqual(len(transformed[table_name]), 3 * 12)
+                    self.assertEqual(pd.Timestamp(transformed[table_name]['Period'].max()).year, sb.LAST_YEAR)
+
+
+if __name__ == '__main__':
+    unittest.main()